@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import argparse
+import configparser
+import multiprocessing
+import numpy as np
+
+from core.line_algorithm import LineDefectAlgorithm
+from core.config_manager import ConfigManager
+from core.report_writer import BatchReportWriter, save_defect_crops
+from core.image_io import raw_format_from_config, expand_frames, FrameSource, FrameReader
+from core.profile_stats import ProfileStatistics, PROFILE_KEYS
+
+# 与主界面下拉框顺序一致 (配置中保存的是索引)
+BITS_OPTIONS = (16, 10, 12, 14)
+CHANNEL_OPTIONS = (4, 16, 64)
+IMAGE_EXTS = {'.png', '.tif', '.tiff', '.raw', '.bmp'}
+
+
+# ==============================================================================
+# 🟢 1. 参数加载 (与 GUI 共用 "Defect Line config.ini"; 不存在时回退 ConfigManager)
+# ==============================================================================
+def default_config_path():
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, "Defect Line config.ini")
+
+
+def load_config(config_path=None):
+    """读取 GUI 保存的 ini (QSettings IniFormat), 不依赖 Qt; 缺失字段用默认值补齐"""
+    cfg = ConfigManager.load_config()
+    path = config_path or default_config_path()
+    if not os.path.exists(path):
+        return cfg
+
+    ini = configparser.ConfigParser()
+    ini.read(path, encoding='utf-8')
+    for section in ('params', 'crop', 'vis', 'raw'):
+        if not ini.has_section(section): continue
+        for key, value in ini.items(section):
+            if key not in cfg: continue
+            default = cfg[key]
+            if isinstance(default, bool):
+                cfg[key] = value.strip().lower() == 'true'
+            elif isinstance(default, int):
+                cfg[key] = int(float(value))
+            elif isinstance(default, float):
+                cfg[key] = float(value)
+    return cfg
+
+
+def params_from_config(cfg):
+    """配置 (下拉框索引) -> run_inspection 参数, 与 LineInspectorApp._get_current_params 对应"""
+    return {
+        'effective_bits': BITS_OPTIONS[cfg.get('effective_bits_idx', 0)],
+        'channel_count': CHANNEL_OPTIONS[cfg.get('channel_count_idx', 0)],
+        'edge_gain': cfg.get('edge_gain', 1.0),
+        'thresh_global_h': cfg.get('thresh_global_h', 20), 'thresh_global_v': cfg.get('thresh_global_v', 20),
+        'thresh_part_h': cfg.get('thresh_part_h', 10), 'thresh_part_v': cfg.get('thresh_part_v', 10),
+        'block_qty': cfg.get('block_qty', 10), 'top_k': cfg.get('top_k', 100),
+        'strip_h': cfg.get('strip_h', 0), 'strip_v': cfg.get('strip_v', 0),
+        'workers': cfg.get('workers', 0),
+        'use_robust': 1 if cfg.get('use_robust', True) else 0
+    }
+
+
+def collect_files(inputs, name_filter=""):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(os.path.join(item, f) for f in os.listdir(item)
+                                if os.path.splitext(f)[1].lower() in IMAGE_EXTS))
+        elif os.path.isfile(item):
+            files.append(item)
+    return [f for f in files if name_filter.lower() in os.path.basename(f).lower()]
+
+
+# ==============================================================================
+# 🟢 2. 单帧任务 (子进程执行: 读帧 + 检测 + 截图, 只把缺陷列表传回主进程; 多帧文件每帧一个任务)
+#    frame 为 None 时整个文件的所有帧平均后检测 (逐帧流式累加, 截图取第 0 帧)
+#    keep_profiles 时额外回传各通道行/列均值曲线 (批次统计用, 每帧 O(w + h))
+#    单个文件出错只记为 ERROR (defects 为 None, 附错误信息), 不中断整个批次
+# ==============================================================================
+_READER = None  # 每个进程一个读帧器: 同一多页文件分到本进程的各帧任务共用一次目录解析
+
+
+def _frame_reader(raw_format):
+    global _READER
+    if _READER is None or _READER.raw_format != raw_format:
+        if _READER is not None: _READER.close()
+        _READER = FrameReader(raw_format)
+    return _READER
+
+
+def inspect_file(task):
+    file_name = task[2]
+    try:
+        return _inspect_file(task)
+    except Exception as e:
+        msg = f"{type(e).__name__}: {e}"
+        print(f"Error inspecting {file_name}: {msg}")
+        return file_name, None, 0.0, [], None, msg
+
+
+def _inspect_file(task):
+    path, frame, file_name, params, img_dir, pad, save_crops, raw_format, keep_profiles = task
+    img = _frame_reader(raw_format).read(path, frame or 0)
+    if img is None:
+        return file_name, None, 0.0, [], None, "Cannot read"
+
+    t0 = time.perf_counter()
+    if frame is None:
+        with FrameSource(path, raw_format) as frames:
+            records, stats = LineDefectAlgorithm.run_stacked_inspection(frames, params)
+    else:
+        records, stats = LineDefectAlgorithm.run_inspection(img, params)
+    defects = LineDefectAlgorithm.defect_dicts(records[np.argsort(records['index'], kind='stable')])
+    dt = time.perf_counter() - t0
+
+    crop_paths = []
+    if defects and save_crops:
+        sub_dir = os.path.join(img_dir, os.path.splitext(file_name)[0])
+        crop_paths = save_defect_crops(img, defects, sub_dir, pad, params.get('block_qty', 10))
+    profiles = {k: stats['channels'][k] for k in PROFILE_KEYS} if keep_profiles else None
+    return file_name, defects, dt, crop_paths, profiles, ""
+
+
+def run_batch(files, params, out_dir, processes=0, pad=20, save_crops=True, progress=None, raw_format=None,
+              average=False, lot_stats=None):
+    """多进程批量检测, 结果按文件 (多帧文件按帧) 顺序流式写入报告; 返回报告路径。raw_format: .raw 文件的 read_raw 参数
+    average: 多帧文件不逐帧检测, 所有帧平均后作为一条结果 (弱线缺陷)
+    lot_stats: .npz 路径, 逐帧累计各通道行/列均值的 Welford 均值/方差 (ProfileStatistics), 定期写回;
+    文件已存在时在其基础上继续累计"""
+    if average:
+        frames = [(p, None, os.path.basename(p)) for p in files]
+    else:
+        frames = expand_frames(files, raw_format)
+    processes = processes if processes > 0 else (os.cpu_count() or 1)
+    processes = max(1, min(processes, len(frames)))
+    if processes > 1:
+        # 进程间已并行, 单进程内不再开线程池, 避免超额订阅
+        params = dict(params, workers=1)
+
+    report = BatchReportWriter(out_dir)
+    lot = ProfileStatistics.open(lot_stats, flush_every=16) if lot_stats else None
+    tasks = [(p, k, label, params, report.img_dir, pad, save_crops, raw_format, lot is not None)
+             for p, k, label in frames]
+    pool = None
+    try:
+        if processes == 1:
+            results = map(inspect_file, tasks)
+        else:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap(inspect_file, tasks)
+
+        for i, (file_name, defects, dt, crop_paths, profiles, error) in enumerate(results):
+            if defects is not None:
+                report.add_result(file_name, defects, dt, crop_paths)
+            else:
+                report.add_error(file_name, error)
+            if profiles is not None:
+                try:
+                    lot.add(profiles)
+                except ValueError as e:
+                    print(f"Lot statistics skip {file_name}: {e}")
+            if progress: progress(i + 1, len(tasks), file_name, defects, dt)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        # 中途出错/中断时结束子进程, 避免残留进程使命令行无法退出
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        excel_path = report.close()
+        if lot is not None: lot.save()
+        if _READER is not None: _READER.close()
+    return excel_path
+
+
+# ==============================================================================
+# 🟢 3. 命令行入口 (无界面): python -m core.batch_inspector <folder> -o <out>
+# ==============================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch line-defect inspection")
+    parser.add_argument('inputs', nargs='+', help="image folders and/or files")
+    parser.add_argument('-o', '--output', default="", help="report directory (default: first input folder)")
+    parser.add_argument('-c', '--config', default=None, help="config ini (default: Defect Line config.ini)")
+    parser.add_argument('-j', '--processes', type=int, default=0, help="worker processes (0 = all cores)")
+    parser.add_argument('--filter', default="", help="only files whose name contains this text")
+    parser.add_argument('--pad', type=int, default=20, help="crop height (±px)")
+    parser.add_argument('--no-crops', action='store_true', help="skip defect crop images")
+    parser.add_argument('--raw-size', default="", metavar="WxH", help=".raw frame size (overrides config)")
+    parser.add_argument('--raw-bits', type=int, default=0, help=".raw bits per pixel: 8 or 10-16 (16-bit container)")
+    parser.add_argument('--raw-big-endian', action='store_true', help=".raw 16-bit words are big-endian")
+    parser.add_argument('--raw-header', type=int, default=-1, help=".raw header bytes to skip")
+    parser.add_argument('--raw-packed', action='store_true', help=".raw is MIPI CSI-2 packed RAW10/12/14")
+    parser.add_argument('--average', action='store_true',
+                        help="inspect each multi-frame file once, on profiles averaged over all frames")
+    parser.add_argument('--lot-stats', default="", metavar="NPZ",
+                        help="accumulate per-row/column mean and variance per channel across the lot into NPZ "
+                             "(an existing NPZ is continued, not overwritten)")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.inputs, args.filter)
+    if not files:
+        print("No matching files!")
+        return 1
+
+    cfg = load_config(args.config)
+    params = params_from_config(cfg)
+    raw_format = raw_format_from_config(cfg)
+    if args.raw_size:
+        raw_format['width'], raw_format['height'] = (int(v) for v in args.raw_size.lower().split('x'))
+    if args.raw_bits: raw_format['bits'] = args.raw_bits
+    if args.raw_big_endian: raw_format['big_endian'] = True
+    if args.raw_header >= 0: raw_format['header'] = args.raw_header
+    if args.raw_packed: raw_format['packed'] = True
+    out_dir = args.output or (args.inputs[0] if os.path.isdir(args.inputs[0]) else os.path.dirname(files[0]))
+    counts = {'FAIL': 0, 'PASS': 0, 'ERROR': 0}
+
+    def progress(i, n, file_name, defects, dt):
+        res_str = "ERROR" if defects is None else ("FAIL" if defects else "PASS")
+        counts[res_str] += 1
+        print(f"[{i}/{n}] {file_name}: {res_str} ({0 if defects is None else len(defects)} defects, {dt:.2f}s)")
+
+    t0 = time.perf_counter()
+    excel_path = run_batch(files, params, out_dir, args.processes, args.pad, not args.no_crops, progress, raw_format,
+                           args.average, args.lot_stats or None)
+    print(f"Done in {time.perf_counter() - t0:.1f}s | PASS {counts['PASS']} | FAIL {counts['FAIL']} | "
+          f"ERROR {counts['ERROR']}")
+    print(f"Report generated: {excel_path}")
+    if args.lot_stats: print(f"Lot statistics: {args.lot_stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
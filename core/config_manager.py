@@ -14,6 +14,7 @@ DEFAULT_CONFIG = {
     "thresh_part_h": 10,
     "thresh_part_v": 10,
     "block_qty": 10,
+    "top_k": 100,
 
     "strip_h": 0,
     "strip_v": 0,
@@ -21,6 +22,14 @@ DEFAULT_CONFIG = {
 
     "vis_pad": 5,
     "crop_pad": 20,
+    "workers": 0,
+
+    "raw_width": 0,
+    "raw_height": 0,
+    "raw_bits": 16,
+    "raw_big_endian": False,
+    "raw_header": 0,
+    "raw_packed": False,
 
     "last_folder": ""
 }
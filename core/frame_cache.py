@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+from core.image_io import read_image, to_native
+
+
+# ==============================================================================
+# 🟢 图像浏览缓存: 按字节预算的 LRU (原图 + 8-bit 预览) + 后台预取前后 N 张
+# ==============================================================================
+def load_frame(path, raw_format=None, frame=0, reader=None):
+    """读原图 (多帧文件的第 frame 帧) 并生成 8-bit 显示预览, 返回 (raw, preview); 读取失败返回 None。
+    .raw 的原图为 np.memmap; reader 为 FrameReader 时由它读取 (同一文件的各帧共用一次目录解析, 忽略 raw_format)"""
+    raw = reader.read(path, frame) if reader is not None else read_image(path, raw_format, frame)
+    if raw is None: return None
+    if raw.dtype.itemsize == 2:
+        # 打包帧的预览需要解包整幅 (检测本身不需要)
+        preview = cv2.normalize(to_native(np.asarray(raw)), None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+    else:
+        preview = raw.astype(np.uint8)
+    return raw, preview
+
+
+def _frame_bytes(frame):
+    """缓存占用: memmap 的数据 (含打包帧的打包字节) 在系统页缓存中, 不计入预算"""
+    return sum(a.nbytes for a in frame
+               if not isinstance(a, np.memmap) and not isinstance(getattr(a, 'packed', None), np.memmap))
+
+
+class FrameCache:
+    def __init__(self, budget_bytes=1 << 30, loader=load_frame, workers=2):
+        self.budget_bytes = budget_bytes
+        self.loader = loader
+        self._entries = OrderedDict()  # key -> (raw, preview), 最近使用的在末尾 (key 为 loader 的参数, 如路径)
+        self._bytes = 0
+        self._pending = {}  # path -> Future (预取中)
+        self._wanted = set()  # 最近一次预取请求的路径; 不在其中且尚未开始的任务直接丢弃
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame_prefetch")
+
+    def get(self, path):
+        """取帧: 命中缓存直接返回; 正在预取则等它完成 (不重复解码); 否则同步读取"""
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                return self._entries[path]
+            self._wanted.add(path)
+            fut = self._pending.get(path)
+
+        frame = fut.result() if fut is not None else None
+        if frame is None:
+            frame = self.loader(path)
+            self._store(path, frame)
+        return frame
+
+    def prefetch(self, paths):
+        """按给定顺序在后台预取; 替换上一次的预取请求 (快速翻页时旧的邻居不再解码)"""
+        with self._lock:
+            self._wanted = set(paths)
+            for p in paths:
+                if p in self._entries or p in self._pending: continue
+                self._pending[p] = self._pool.submit(self._prefetch_one, p)
+
+    def _prefetch_one(self, path):
+        try:
+            with self._lock:
+                if path not in self._wanted: return None
+            frame = self.loader(path)
+            self._store(path, frame)
+            return frame
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def _store(self, path, frame):
+        if frame is None: return
+        size = _frame_bytes(frame)
+        with self._lock:
+            if path in self._entries: return
+            self._entries[path] = frame
+            self._bytes += size
+            # 超出预算: 从最久未使用的开始淘汰 (至少保留刚放入的这一帧)
+            while self._bytes > self.budget_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= _frame_bytes(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._wanted = set()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
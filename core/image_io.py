@@ -0,0 +1,243 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+from core.line_algorithm import MipiPackedFrame
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+RAW_EXTS = {'.raw'}
+TIFF_EXTS = {'.tif', '.tiff'}
+
+
+# ==============================================================================
+# 🟢 1. RAW 帧读取 (无压缩传感器数据): np.memmap 零拷贝映射, 检测内核直接按行读取磁盘页
+# ==============================================================================
+def raw_format_from_config(cfg):
+    """配置 -> read_raw 参数 (宽高为 0 表示未设置, .raw 文件无法读取)"""
+    return {'width': int(cfg.get('raw_width', 0)), 'height': int(cfg.get('raw_height', 0)),
+            'bits': int(cfg.get('raw_bits', 16)), 'big_endian': bool(cfg.get('raw_big_endian', False)),
+            'header': int(cfg.get('raw_header', 0)), 'packed': bool(cfg.get('raw_packed', False))}
+
+
+def _raw_layout(width, height, bits=16, big_endian=False, packed=False, stride=0, **_):
+    """(存储 dtype, 每行字节数); 宽高未设置时抛 ValueError"""
+    if width <= 0 or height <= 0:
+        raise ValueError("RAW width/height not set")
+    if packed:
+        return np.dtype(np.uint8), stride or MipiPackedFrame.line_bytes(width, bits)
+    dtype = np.dtype(np.uint8) if bits <= 8 else np.dtype('>u2' if big_endian else '<u2')
+    return dtype, width * dtype.itemsize
+
+
+def raw_frame_count(path, raw_format):
+    """文件中连续存放的完整帧数 (每帧前不另带文件头); 格式未设置或文件过小时为 0"""
+    try:
+        _, line = _raw_layout(**raw_format)
+        return max(0, (os.path.getsize(path) - raw_format.get('header', 0)) // (line * raw_format['height']))
+    except (ValueError, OSError, TypeError, KeyError):
+        return 0
+
+
+def read_raw(path, width, height, bits=16, big_endian=False, header=0, packed=False, stride=0, frame=0):
+    """把 raw 帧映射为 (height, width) 的只读 np.memmap, 不读入也不拷贝数据。
+    bits <= 8 按 uint8 存储, 否则按 16-bit 容器 (10/12/14-bit 数据); 大端数据的 dtype 为 '>u2',
+    LineDefectAlgorithm 以本机字节序视图读取并把字节交换并入还原查找表。
+    packed: MIPI CSI-2 打包 RAW10/12/14, 返回 MipiPackedFrame (检测内核逐行解包); stride 为行字节数 (0 = 紧密排列)。
+    frame: 多帧 raw (帧连续存放在文件头之后) 的帧号"""
+    dtype, line = _raw_layout(width, height, bits, big_endian, packed, stride)
+    offset = header + frame * line * height
+    need = offset + line * height
+    size = os.path.getsize(path)
+    if size < need:
+        raise ValueError(f"{os.path.basename(path)}: {size} bytes, frame {frame} of {width}x{height} {bits}-bit "
+                         f"{'packed ' if packed else ''}(+{header} header) needs {need}")
+    data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(height, line // dtype.itemsize))
+    return MipiPackedFrame(data, width, bits) if packed else data
+
+
+def to_native(img):
+    """非本机字节序 (大端 raw) 转为本机字节序副本; cv2 等只接受本机字节序, 只对截图/预览等小块数据调用"""
+    if img is None or img.dtype.isnative: return img
+    return img.astype(img.dtype.newbyteorder('='))
+
+
+# ==============================================================================
+# 🟢 2. 统一读图入口 (浏览缓存 / 批量弹窗 / 无界面批量共用)
+# ==============================================================================
+def read_image(path, raw_format=None, frame=0):
+    """.raw 按 raw_format 映射, TIFF 经 FrameSource 逐页解码 (每页同一后端), 其他格式 cv2.imread(IMREAD_UNCHANGED);
+    frame 为多帧文件 (多页 TIFF / 多帧 raw) 的帧号。读取失败返回 None (原因打印到控制台)。
+    单次读取用; 逐帧遍历同一文件请复用 FrameSource / FrameReader (每次打开都要重新解析 TIFF 目录)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in RAW_EXTS:
+        try:
+            return read_raw(path, **(raw_format or {'width': 0, 'height': 0}), frame=frame)
+        except (ValueError, OSError) as e:
+            print(f"Error reading raw: {e}")
+            return None
+    if ext in TIFF_EXTS:
+        try:
+            with FrameSource(path) as src:
+                return src.frame(frame)
+        except Exception as e:
+            print(f"Error reading {os.path.basename(path)}: {e}")
+            return None
+    return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+
+# ==============================================================================
+# 🟢 3. 多帧来源 (多页 TIFF / 多帧 raw / 图像序列): 逐帧读取, 峰值内存约一帧, 与叠帧深度无关
+# ==============================================================================
+class FrameSource:
+    """按帧号随机读取或逐帧迭代。多帧 raw 每帧是 memmap 切片; TIFF 逐页解码
+    (有 tifffile 时所有页都由 tifffile 读取, 可映射的页直接 memmap, 彩色页转为 cv2 的 BGR 顺序;
+    否则 cv2.imreadmulti 每次只读一页); 序列每个文件取第一帧"""
+
+    def __init__(self, source, raw_format=None):
+        """source: 文件路径, 或图像路径列表 (图像序列)"""
+        self.raw_format = raw_format
+        self._tif = None
+        if isinstance(source, (list, tuple)):
+            self.paths, self.kind = list(source), 'seq'
+            self.count = len(self.paths)
+            return
+        self.paths = [source]
+        ext = os.path.splitext(source)[1].lower()
+        if ext in RAW_EXTS:
+            self.kind, self.count = 'raw', raw_frame_count(source, raw_format or {})
+        elif ext in TIFF_EXTS:
+            self.kind = 'tiff'
+            if tifffile is not None:
+                self._tif = tifffile.TiffFile(source)
+                self.count = len(self._tif.pages)
+            else:
+                self.count = cv2.imcount(source)
+        else:
+            self.kind, self.count = 'image', 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for k in range(self.count):
+            yield self.frame(k)
+
+    def frame(self, k):
+        """第 k 帧 (读取失败返回 None)"""
+        if not 0 <= k < self.count: return None
+        if self.kind == 'seq':
+            return read_image(self.paths[k], self.raw_format)
+        path = self.paths[0]
+        if self.kind == 'raw':
+            return read_image(path, self.raw_format, k)
+        if self.kind == 'tiff':
+            if self._tif is not None:
+                return self._tiff_page(k)
+            return self._cv2_page(k)
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+    def _cv2_page(self, k):
+        ok, mats = cv2.imreadmulti(self.paths[0], start=k, count=1, flags=cv2.IMREAD_UNCHANGED)
+        return mats[0] if ok and mats else None
+
+    def _tiff_page(self, k):
+        """tifffile 读第 k 页 (复用已解析的目录): 单通道无压缩页按数据偏移直接 memmap, 其余解码;
+        缺少解码器 (如 LZW 需要 imagecodecs) 时该页改用 cv2 解码, 两者输出的通道顺序相同"""
+        page = self._tif.pages[k]
+        if getattr(page, 'is_memmappable', False) and page.samplesperpixel == 1:
+            dtype = np.dtype(page.dtype).newbyteorder(self._tif.byteorder)
+            return np.memmap(self.paths[0], dtype=dtype, mode='r', offset=page.dataoffsets[0], shape=page.shape)
+        try:
+            img = page.asarray()
+        except Exception:
+            return self._cv2_page(k)
+        if img.ndim == 3 and img.shape[2] in (3, 4):  # RGB(A) -> BGR(A), 与 cv2.imread 的单页结果一致
+            img = np.ascontiguousarray(img[..., [2, 1, 0, 3][:img.shape[2]]])
+        return img
+
+    def close(self):
+        if self._tif is not None:
+            self._tif.close()
+            self._tif = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameReader:
+    """按 (路径, 帧号) 读帧, 每个线程保持自己最近一个文件的 FrameSource 打开: 逐帧遍历多页 TIFF 时只解析一次目录。
+    可在多个线程中共用 (各线程的来源互不干扰, 解码并行; 锁只保护打开/关闭登记); raw_format 变化时新建一个"""
+
+    def __init__(self, raw_format=None):
+        self.raw_format = raw_format
+        self._local = threading.local()  # 各线程: (代号, FrameSource)
+        self._sources = set()
+        self._generation = 0  # close() 后递增, 各线程旧的来源作废
+        self._lock = threading.Lock()
+
+    def read(self, path, frame=0):
+        """同 read_image(path, raw_format, frame); 读取失败返回 None (原因打印到控制台)"""
+        gen, src = getattr(self._local, 'slot', (-1, None))
+        try:
+            if src is None or gen != self._generation or src.paths[0] != path:
+                self._release(src)
+                src = None
+                src = FrameSource(path, self.raw_format)
+                with self._lock:
+                    self._sources.add(src)
+                    self._local.slot = (self._generation, src)
+            return src.frame(frame)
+        except Exception as e:
+            print(f"Error reading {os.path.basename(path)}: {e}")
+            self._release(src)
+            self._local.slot = (-1, None)
+            return None
+
+    def _release(self, src):
+        if src is None: return
+        with self._lock:
+            self._sources.discard(src)
+        src.close()
+
+    def close(self):
+        """关闭所有线程打开的来源 (之后仍可继续 read, 按需重新打开)"""
+        with self._lock:
+            sources, self._sources = self._sources, set()
+            self._generation += 1
+        for src in sources:
+            src.close()
+
+
+def frame_count(path, raw_format=None):
+    """文件包含的帧数 (多页 TIFF 的页数 / 多帧 raw 的帧数, 其他为 1; 无法读取为 0)"""
+    try:
+        with FrameSource(path, raw_format) as src:
+            return len(src)
+    except Exception as e:
+        print(f"Error reading {os.path.basename(path)}: {e}")
+        return 0
+
+
+def frame_label(path, k, n):
+    """报告/截图中的帧名: 单帧文件为原文件名, 多帧文件为 "名称#k.扩展名" (截图子目录按名称区分)"""
+    name = os.path.basename(path)
+    if n <= 1: return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}#{k}{ext}"
+
+
+def expand_frames(paths, raw_format=None):
+    """文件列表 -> [(path, 帧号, 帧名), ...]: 多帧文件展开为逐帧条目, 读不出帧的文件保留一条 (读取时报错)"""
+    items = []
+    for p in paths:
+        n = frame_count(p, raw_format)
+        items.extend((p, k, frame_label(p, k, n)) for k in range(max(n, 1)))
+    return items
@@ -1,6 +1,8 @@
+import os
 import numpy as np
 import cv2
 from numba import jit
+from concurrent.futures import ThreadPoolExecutor
 
 
 # ==============================================================================
@@ -72,205 +74,930 @@ def _numba_restore_14bit(img_flat):
     return out
 
 
+# 🟢 MIPI CSI-2 打包 RAW 逐行解包: RAW10 每 4 像素 5 字节, RAW12 每 2 像素 3 字节, RAW14 每 4 像素 7 字节
+# 每组先是各像素的高 8 位, 其后的字节 (小端拼接) 依次存放各像素的低 bits-8 位; 行尾不足一组时按整组存储
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_unpack_mipi_row(src, i, bits, row):
+    w = len(row)
+    line = src[i]
+    j = 0
+    # 整组展开 (常见位深各一段, 每组只读一次低位字节)
+    if bits == 10:
+        for b in range(0, (w // 4) * 5, 5):
+            lo = np.int64(line[b + 4])
+            row[j] = (np.int64(line[b]) << 2) | (lo & 0x3)
+            row[j + 1] = (np.int64(line[b + 1]) << 2) | ((lo >> 2) & 0x3)
+            row[j + 2] = (np.int64(line[b + 2]) << 2) | ((lo >> 4) & 0x3)
+            row[j + 3] = (np.int64(line[b + 3]) << 2) | (lo >> 6)
+            j += 4
+    elif bits == 12:
+        for b in range(0, (w // 2) * 3, 3):
+            lo = np.int64(line[b + 2])
+            row[j] = (np.int64(line[b]) << 4) | (lo & 0xf)
+            row[j + 1] = (np.int64(line[b + 1]) << 4) | (lo >> 4)
+            j += 2
+    else:
+        for b in range(0, (w // 4) * 7, 7):
+            lo = np.int64(line[b + 4]) | (np.int64(line[b + 5]) << 8) | (np.int64(line[b + 6]) << 16)
+            row[j] = (np.int64(line[b]) << 6) | (lo & 0x3f)
+            row[j + 1] = (np.int64(line[b + 1]) << 6) | ((lo >> 6) & 0x3f)
+            row[j + 2] = (np.int64(line[b + 2]) << 6) | ((lo >> 12) & 0x3f)
+            row[j + 3] = (np.int64(line[b + 3]) << 6) | (lo >> 18)
+            j += 4
+    # 行尾不足一组的像素
+    if j < w:
+        n = 2 if bits == 12 else 4
+        gb = n * bits // 8
+        lb = bits - 8
+        base = (j // n) * gb
+        lo = 0
+        for b in range(gb - n):
+            lo |= np.int64(line[base + n + b]) << (8 * b)
+        for k in range(w - j):
+            row[j + k] = (np.int64(line[base + k]) << lb) | ((lo >> (lb * k)) & ((1 << lb) - 1))
+
+
+# 处理 [i0, i1) 行带, 便于多线程按行带切分 (nogil)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_unpack_mipi(src, bits, out, i0, i1):
+    for i in range(i0, i1):
+        _numba_unpack_mipi_row(src, i, bits, out[i])
+
+
+# 🟢 查表还原: out[i, j] = lut[src[i, j]]，处理 [i0, i1) 行带 (out 可与 src 为同一数组)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_apply_lut(src, lut, out, i0, i1):
+    w = src.shape[1]
+    for i in range(i0, i1):
+        for j in range(w):
+            out[i, j] = lut[src[i, j]]
+
+
+# 🟢 取一行像素到 int64 行缓冲; use_lut 时顺带完成位深还原 (融合路径, 不生成整幅还原图)
+# packing = 10/12/14 时 img 为 MIPI 打包字节 (h, stride), 先逐行解包 (检测直接读打包数据, 不生成解包图)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_load_row(img, i, packing, lut, use_lut, row):
+    w = len(row)
+    if packing:
+        _numba_unpack_mipi_row(img, i, packing, row)
+        if use_lut:
+            for j in range(w):
+                row[j] = lut[row[j]]
+    elif use_lut:
+        for j in range(w):
+            row[j] = lut[img[i, j]]
+    else:
+        for j in range(w):
+            row[j] = img[i, j]
+
+
+# 🟢 单次遍历多通道投影: 一次读图同时累加所有 Bayer/Quad 通道的行和/列和 (整型累加器)
+# row_sums[ch, r] = 通道 ch 第 r 行之和 (各行带写入互不重叠); ch = y_off * step + x_off
+# col_acc[cy, j] = y_off 为 cy 的所有行在第 j 列之和 (每个行带私有, 最后求和再按 x_off 拆分)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_accumulate_channel_row(row, i, step, row_sums, col_acc):
+    w = len(row)
+    cy = i % step
+    r = i // step
+    acc = col_acc[cy]
+    for j in range(w):
+        acc[j] += row[j]
+    # 当前行仍在缓存中, 按 x_off 分别求行和
+    for k in range(step):
+        s = 0
+        for j in range(k, w, step):
+            s += row[j]
+        row_sums[cy * step + k, r] = s
+
+
+# 处理 [i0, i1) 行带, 便于多线程按行带切分 (nogil)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_channel_profiles(img, w, packing, lut, use_lut, step, i0, i1, row_sums, col_acc):
+    row = np.empty(w, dtype=np.int64)
+    for i in range(i0, i1):
+        _numba_load_row(img, i, packing, lut, use_lut, row)
+        _numba_accumulate_channel_row(row, i, step, row_sums, col_acc)
+
+
+# 🟢 批量邻域差分: 每行一条曲线 (有效长度 lengths[k])，一次调用处理所有通道的所有 Block
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_calc_neighbor_diff_robust_2d(signals, lengths, edge_gain, use_robust):
+    n, m = signals.shape
+    out = np.zeros((n, m), dtype=np.float32)
+    for k in range(n):
+        L = lengths[k]
+        if L > 0:
+            out[k, :L] = _numba_calc_neighbor_diff_robust(signals[k, :L], edge_gain, use_robust)
+    return out
+
+
+# 🟢 Block 行/列投影: 一次读图同时得到所有通道、所有 Block 的行和与列和 (横向/纵向 Part 共用)
+# row_out[ch, by, bx, si] = Block(by, bx) 第 si 行之和 (各行带写入互不重叠)
+# col_out[ch, by, bx, sj] = Block(by, bx) 第 sj 列之和 (每个行带私有, 最后求和)
+# bh_arr[ch] == 0 表示该通道 Block 过小, 不做 Part 检测
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_accumulate_block_row(row, i, step, block_n, bh_arr, bw_arr, row_out, col_out):
+    cy = i % step
+    r = i // step
+    for cx in range(step):
+        ch = cy * step + cx
+        bh = bh_arr[ch]
+        bw = bw_arr[ch]
+        if bh == 0 or r >= block_n * bh: continue
+        by = r // bh
+        si = r - by * bh
+        j = cx
+        for bx in range(block_n):
+            s = 0
+            col_acc = col_out[ch, by, bx]
+            for sj in range(bw):
+                v = row[j]
+                s += v
+                col_acc[sj] += v
+                j += step
+            row_out[ch, by, bx, si] = s
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_block_profiles(img, w, packing, lut, use_lut, step, block_n, bh_arr, bw_arr, i0, i1, row_out, col_out):
+    row = np.empty(w, dtype=np.int64)
+    for i in range(i0, i1):
+        _numba_load_row(img, i, packing, lut, use_lut, row)
+        _numba_accumulate_block_row(row, i, step, block_n, bh_arr, bw_arr, row_out, col_out)
+
+
+# 🟢 积分投影索引: 按通道步长的前缀和 (uint32 回绕运算, 单行/单列之和 < 2^32 时差值精确)
+# row_prefix[i, j + step] = row_prefix[i, j] + img[i, j]  (同一行内, 同一 x_off 的列前缀和)
+# col_prefix[i + step, j] = col_prefix[i, j] + img[i, j]  (同一列内, 同一 y_off 的行前缀和)
+@jit(nopython=True, nogil=True, cache=True)
+def _numba_build_profile_index(img, w, packing, lut, use_lut, step):
+    h = img.shape[0]
+    row_prefix = np.zeros((h, w + step), dtype=np.uint32)
+    col_prefix = np.zeros((h + step, w), dtype=np.uint32)
+    row = np.empty(w, dtype=np.int64)
+    for i in range(h):
+        _numba_load_row(img, i, packing, lut, use_lut, row)
+        for j in range(w):
+            v = np.uint32(row[j])
+            row_prefix[i, j + step] = row_prefix[i, j] + v
+            col_prefix[i + step, j] = col_prefix[i, j] + v
+    return row_prefix, col_prefix
+
+
 # ==============================================================================
-# 🟢 2. LineDefectAlgorithm 类
+# 🟢 2. 并行执行 (内核均为 nogil, 线程池按行带 / 曲线分块并发)
 # ==============================================================================
+_THREAD_POOLS = {}
+
+
+def resolve_workers(params):
+    """params['workers']: 1 = 串行 (默认), 0 = 使用全部 CPU 核, N = N 个线程"""
+    n = int(params.get('workers', 1) or 0)
+    if n <= 0: n = os.cpu_count() or 1
+    return n
+
+
+# uint16 输入下每种位深都是固定的 65536 项映射, 由原有还原内核一次性生成
+_RESTORE_LUTS = {}
+_NO_LUT = np.zeros(1, dtype=np.uint16)
+
+
+def get_restore_lut(effective_bits, swapped=False):
+    """返回位深还原查找表 (uint16[65536])，16-bit 等无需还原的位深返回 None。
+    swapped=True: 输入码值为字节交换后的值 (大端数据按本机字节序读取), 交换并入查表, 16-bit 也返回表"""
+    if swapped:
+        lut = _RESTORE_LUTS.get((effective_bits, 'swapped'))
+        if lut is None:
+            codes = np.arange(65536, dtype=np.uint16).byteswap()
+            base = get_restore_lut(effective_bits)
+            lut = codes if base is None else base[codes]
+            _RESTORE_LUTS[(effective_bits, 'swapped')] = lut
+        return lut
+    if effective_bits not in (10, 12, 14):
+        return None
+    lut = _RESTORE_LUTS.get(effective_bits)
+    if lut is None:
+        codes = np.arange(65536, dtype=np.uint16)
+        if effective_bits == 10:
+            lut = _numba_restore_10bit(codes)
+        elif effective_bits == 14:
+            lut = _numba_restore_14bit(codes)
+        else:
+            lut = np.right_shift(codes, 16 - 12).astype(np.uint16)
+        _RESTORE_LUTS[effective_bits] = lut
+    return lut
+
+
+def input_view(img, effective_bits=None):
+    """检测输入 -> (本机字节序视图, 还原查找表); 大端 16-bit (raw 的 memmap) 不拷贝, 字节交换在查表时完成。
+    effective_bits 为 None 表示输入已还原 (只在需要字节交换时返回查找表)。
+    MIPI 打包帧解包后已是真实码值 (非左对齐 16-bit), 忽略 effective_bits, 不查表"""
+    if isinstance(img, MipiPackedFrame):
+        return img, None
+    swapped = img.dtype.itemsize > 1 and not img.dtype.isnative
+    if swapped:
+        img = img.view(img.dtype.newbyteorder('='))
+    return img, get_restore_lut(16 if effective_bits is None else effective_bits, swapped)
+
+
+def _lut_args(lut):
+    """融合还原内核的 (lut, use_lut) 参数"""
+    return (_NO_LUT, False) if lut is None else (lut, True)
+
+
+def _src_args(img):
+    """投影内核的 (src, w, packing) 参数: MIPI 打包帧传打包字节由内核逐行解包, 其余按原数组读取"""
+    if isinstance(img, MipiPackedFrame):
+        return img.packed, img.shape[1], img.bits
+    return np.ascontiguousarray(img), img.shape[1], 0
+
+
+def _get_thread_pool(workers):
+    pool = _THREAD_POOLS.get(workers)
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="line_algo")
+        _THREAD_POOLS[workers] = pool
+    return pool
+
+
+def _map_bands(n, workers, fn, min_band=64):
+    """把 [0, n) 切成最多 workers 段并发执行 fn(i0, i1), 按顺序返回结果; 段数为 1 时直接在当前线程执行"""
+    bands = max(1, min(workers, n // min_band))
+    if bands <= 1:
+        return [fn(0, n)]
+    bounds = np.linspace(0, n, bands + 1).astype(np.int64)
+    pool = _get_thread_pool(workers)
+    return list(pool.map(fn, bounds[:-1], bounds[1:]))
+
+
+# ==============================================================================
+# 🟢 3. LineDefectAlgorithm 类
+# ==============================================================================
+# 缺陷记录: 结构化数组 (纯数值字段), 去重/排序全部向量化; Global 记录的 block_y/block_x 为 -1
+DEFECT_H, DEFECT_V = 0, 1
+DEFECT_TYPES = ('Horizontal', 'Vertical')
+DEFECT_DTYPE = np.dtype([('ch', np.int16), ('type', np.uint8), ('is_global', np.bool_),
+                         ('block_y', np.int16), ('block_x', np.int16), ('index', np.int32), ('diff', np.float32)])
+
+
 class LineDefectAlgorithm:
 
     # 🟢 [新增] 公开的还原接口，确保 UI 和 算法 使用同一套逻辑
     @staticmethod
-    def restore_image(img_raw, effective_bits):
-        h, w = img_raw.shape[:2]
+    def restore_image(img_raw, effective_bits, out=None, workers=1):
+        """位深还原: 10/12/14-bit 查表 (65536 项 LUT)，16-bit / 8-bit 原样返回。
+        out 为调用方提供的 uint16 缓冲区 (可以就是 img_raw 本身, 即原地还原); workers > 1 时按行带并发"""
+        if isinstance(img_raw, MipiPackedFrame):  # 解包结果已是真实码值, 不再按 effective_bits 查表
+            return img_raw.unpack(workers, out)
+        img_raw, lut = input_view(img_raw, effective_bits)
+        if lut is None:
+            # 16-bit or 8-bit default
+            if out is None: return img_raw
+            np.copyto(out, img_raw)
+            return out
 
-        if effective_bits == 10:
-            # 必须展平传给 Numba
-            flat = img_raw.ravel()
-            return _numba_restore_10bit(flat).reshape((h, w))
+        if img_raw.ndim != 2:
+            return lut[img_raw]
 
-        elif effective_bits == 14:
-            flat = img_raw.ravel()
-            return _numba_restore_14bit(flat).reshape((h, w))
+        if out is None:
+            out = np.empty(img_raw.shape, dtype=np.uint16)
+        _map_bands(img_raw.shape[0], workers, lambda i0, i1: _numba_apply_lut(img_raw, lut, out, i0, i1))
+        return out
 
-        elif effective_bits == 12:
-            shift = 16 - 12
-            return np.right_shift(img_raw, shift).astype(np.uint16)
+    # 🟢 [新增] MIPI 打包 RAW 解包 (按行带并发); 检测本身不需要, 投影内核直接读打包数据
+    @staticmethod
+    def unpack_mipi(packed, width, bits, workers=1, out=None):
+        """packed: (h, stride) uint8 (可为 memmap) -> (h, width) uint16 真实码值; bits 为 10/12/14"""
+        if out is None:
+            out = np.empty((packed.shape[0], width), dtype=np.uint16)
+        _map_bands(packed.shape[0], workers, lambda i0, i1: _numba_unpack_mipi(packed, bits, out, i0, i1))
+        return out
+
+    # 🟢 [新增] 单次遍历求所有通道的行/列均值曲线, 替代逐通道 np.mean(axis=0/1)
+    @staticmethod
+    def compute_channel_profiles(img_proc, ch_total, workers=1, lut=None):
+        """返回 [(y_off, x_off, row_avgs, col_avgs), ...]，顺序与 ch_idx 一致，空通道的曲线长度为 0。
+        lut 不为空时 img_proc 视为原始图, 位深还原在累加时逐像素完成"""
+        step = int(np.sqrt(ch_total))
+        h, w = img_proc.shape[:2]
+        src = _src_args(img_proc)
+        row_sums = np.zeros((step * step, (h + step - 1) // step), dtype=np.int64)
+        lut_arr, use_lut = _lut_args(lut)
 
-        else:
-            # 16-bit or 8-bit default
-            return img_raw
+        def band(i0, i1):
+            col_acc = np.zeros((step, w), dtype=np.int64)
+            _numba_channel_profiles(*src, lut_arr, use_lut, step, i0, i1, row_sums, col_acc)
+            return col_acc
+
+        col_acc = sum(_map_bands(h, workers, band))
+        col_sums = np.zeros((step * step, (w + step - 1) // step), dtype=np.int64)
+        for y in range(step):
+            for x in range(step):
+                col_sums[y * step + x, :len(range(x, w, step))] = col_acc[y, x::step]
+
+        profiles = []
+        for y in range(step):
+            ch_h = len(range(y, h, step))
+            for x in range(step):
+                ch_w = len(range(x, w, step))
+                ch = y * step + x
+                if ch_h == 0 or ch_w == 0:
+                    empty = np.zeros(0, dtype=np.float32)
+                    profiles.append((y, x, empty, empty))
+                    continue
+                row_avgs = (row_sums[ch, :ch_h] / ch_w).astype(np.float32)
+                col_avgs = (col_sums[ch, :ch_w] / ch_h).astype(np.float32)
+                profiles.append((y, x, row_avgs, col_avgs))
+        return profiles
+
+    # 🟢 [新增] Block (Part) 行/列投影, 所有通道/Block 一次归约完成
+    @staticmethod
+    def compute_block_profiles(img_proc, ch_total, block_n, workers=1, lut=None):
+        """返回 (blk_row_avgs, blk_col_avgs, bh_arr, bw_arr)：
+        blk_row_avgs 形状 (ch, block_n, block_n, max_bh)，blk_col_avgs 形状 (ch, block_n, block_n, max_bw)，
+        bh_arr/bw_arr[ch] 为该通道 Block 尺寸 (0 表示 Block 过小, 跳过)"""
+        step = int(np.sqrt(ch_total))
+        h, w = img_proc.shape[:2]
+        n_ch = step * step
+        bn = max(block_n, 0)
+        bh_arr = np.zeros(n_ch, dtype=np.int64)
+        bw_arr = np.zeros(n_ch, dtype=np.int64)
+        if block_n > 0:
+            for y in range(step):
+                for x in range(step):
+                    bh = len(range(y, h, step)) // block_n
+                    bw = len(range(x, w, step)) // block_n
+                    if bh > 8 and bw > 8:
+                        bh_arr[y * step + x], bw_arr[y * step + x] = bh, bw
+
+        max_bh, max_bw = int(bh_arr.max()), int(bw_arr.max())
+        if max_bh == 0:
+            empty = np.zeros((n_ch, bn, bn, 0), dtype=np.float32)
+            return empty, empty, bh_arr, bw_arr
+
+        src = _src_args(img_proc)
+        row_sums = np.zeros((n_ch, block_n, block_n, max_bh), dtype=np.int64)
+        lut_arr, use_lut = _lut_args(lut)
+
+        def band(i0, i1):
+            col_out = np.zeros((n_ch, block_n, block_n, max_bw), dtype=np.int64)
+            _numba_block_profiles(*src, lut_arr, use_lut, step, block_n, bh_arr, bw_arr, i0, i1, row_sums, col_out)
+            return col_out
+
+        col_sums = sum(_map_bands(h, workers, band))
+        row_div = np.where(bw_arr > 0, bw_arr, 1).reshape(-1, 1, 1, 1)
+        col_div = np.where(bh_arr > 0, bh_arr, 1).reshape(-1, 1, 1, 1)
+        return (row_sums / row_div).astype(np.float32), (col_sums / col_div).astype(np.float32), bh_arr, bw_arr
+
+    @staticmethod
+    def _stack_profiles(curves):
+        """不等长曲线补零堆叠为 (n, max_len) float32 矩阵"""
+        out = np.zeros((len(curves), max([len(c) for c in curves] + [0])), dtype=np.float32)
+        for k, c in enumerate(curves):
+            out[k, :len(c)] = c
+        return out
+
+    # 🟢 [新增] 批量差分: 多条曲线按行分块并发调用 2D 内核
+    @staticmethod
+    def _batched_diffs(signals, lengths, edge_gain, use_robust, workers=1):
+        return np.concatenate(_map_bands(
+            len(signals), workers,
+            lambda k0, k1: _numba_calc_neighbor_diff_robust_2d(signals[k0:k1], lengths[k0:k1],
+                                                               float(edge_gain), use_robust),
+            min_band=4
+        ))
+
+    # 🟢 [新增] Part 单方向差分: 批量差分 + 裁边, 返回 (ch, by, bx, 块内偏移) 的差分矩阵 (尚未比较阈值)
+    @staticmethod
+    def _part_block_diffs(blk_avgs, blk_len, ch_len, strip_sub, along_y, edge_gain, use_robust, workers=1):
+        n_ch, block_n, _, max_len = blk_avgs.shape
+        lengths = np.repeat(blk_len, block_n * block_n)
+        blk_diffs = LineDefectAlgorithm._batched_diffs(blk_avgs.reshape(-1, max_len), lengths,
+                                                       edge_gain, use_robust, workers).reshape(blk_avgs.shape)
+
+        # 裁边: 完全落在 strip 区域内的 Block 不参与判定 (横向看 by, 纵向看 bx)
+        if strip_sub > 0:
+            b0 = np.arange(block_n)[None, :] * blk_len[:, None]
+            b1 = b0 + blk_len[:, None]
+            stripped = (b1 <= strip_sub) | (b0 >= ch_len.reshape(-1, 1) - strip_sub)
+            if along_y:
+                blk_diffs[stripped] = 0
+            else:
+                blk_diffs[stripped[:, None, :].repeat(block_n, axis=1)] = 0
+        return blk_diffs
 
     # 🟢 [新增] ROI 快速统计 (假设传入的 roi_img 已经是还原好的)
     @staticmethod
     def compute_roi_statistics(roi_img, params):
+        ch_total = params.get('channel_count', 4)
+        h, w = roi_img.shape
+        profiles = LineDefectAlgorithm.compute_channel_profiles(roi_img, ch_total)
+        return LineDefectAlgorithm.merge_roi_profiles(profiles, h, w, params)
+
+    # 🟢 [新增] 由各通道均值曲线合成 ROI 统计 (逐通道差分后取包络)
+    @staticmethod
+    def merge_roi_profiles(profiles, h, w, params):
         ch_total = params.get('channel_count', 4)
         edge_gain = params.get('edge_gain', 1.0)
         use_robust = True if params.get('use_robust', 0) > 0 else False
         step = int(np.sqrt(ch_total))
 
-        h, w = roi_img.shape
         full_row_diff = np.zeros(h, dtype=np.float32)
         full_row_avg = np.zeros(h, dtype=np.float32)
         full_col_diff = np.zeros(w, dtype=np.float32)
         full_col_avg = np.zeros(w, dtype=np.float32)
 
-        for y in range(step):
-            for x in range(step):
-                sub = roi_img[y::step, x::step]
-                if sub.size == 0: continue
+        for y, x, r_avg, c_avg in profiles:
+            if len(r_avg) == 0: continue
 
-                r_avg = np.mean(sub, axis=1).astype(np.float32)
-                c_avg = np.mean(sub, axis=0).astype(np.float32)
-                r_diff = _numba_calc_neighbor_diff_robust(r_avg, float(edge_gain), use_robust)
-                c_diff = _numba_calc_neighbor_diff_robust(c_avg, float(edge_gain), use_robust)
+            r_diff = _numba_calc_neighbor_diff_robust(r_avg, float(edge_gain), use_robust)
+            c_diff = _numba_calc_neighbor_diff_robust(c_avg, float(edge_gain), use_robust)
 
-                iy = np.arange(y, h, step)[:len(r_diff)]
-                full_row_diff[iy] = np.maximum(full_row_diff[iy], r_diff)
-                full_row_avg[iy] = r_avg
+            iy = np.arange(y, h, step)[:len(r_diff)]
+            full_row_diff[iy] = np.maximum(full_row_diff[iy], r_diff)
+            full_row_avg[iy] = r_avg
 
-                ix = np.arange(x, w, step)[:len(c_diff)]
-                full_col_diff[ix] = np.maximum(full_col_diff[ix], c_diff)
-                full_col_avg[ix] = c_avg
+            ix = np.arange(x, w, step)[:len(c_diff)]
+            full_col_diff[ix] = np.maximum(full_col_diff[ix], c_diff)
+            full_col_avg[ix] = c_avg
 
         return {
             'row_diff': full_row_diff, 'row_avg': full_row_avg,
             'col_diff': full_col_diff, 'col_avg': full_col_avg
         }
 
+    # 🟢 [新增] Global 差分曲线 (与阈值无关, 可缓存): 各通道行/列均值曲线 + 裁边后的差分矩阵
     @staticmethod
-    def run_inspection(img_input, params, is_preprocessed=False):
-        # 1. 如果 UI 还没预处理，这里处理；如果已处理，跳过
-        if not is_preprocessed:
-            real_bits = params.get('effective_bits', 16)
-            img_proc = LineDefectAlgorithm.restore_image(img_input, real_bits)
-        else:
-            img_proc = img_input
-
-        # 2. 这里的逻辑与 compute_roi_statistics 类似，但增加了缺陷判定
+    def compute_global_diffs(img_proc, params, lut=None, workers=1):
         h, w = img_proc.shape[:2]
-        ch_total = params.get('channel_count', 4)
-        step = int(np.sqrt(ch_total))
+        # 单次遍历得到所有通道的行/列均值曲线
+        profiles = LineDefectAlgorithm.compute_channel_profiles(img_proc, params.get('channel_count', 4), workers, lut)
+        return LineDefectAlgorithm.global_diffs_from_profiles(profiles, h, w, params, workers)
 
-        channels = []
-        channel_offsets = []
-        for y in range(step):
-            for x in range(step):
-                channels.append(img_proc[y::step, x::step])
-                channel_offsets.append((y, x))
+    # 🟢 [新增] 由各通道均值曲线求 Global 差分 (单帧投影与多帧平均曲线共用)
+    @staticmethod
+    def global_diffs_from_profiles(profiles, h, w, params, workers=1):
+        step = int(np.sqrt(params.get('channel_count', 4)))
+        edge_gain = params.get('edge_gain', 1.0)
+        use_robust = True if params.get('use_robust', 0) > 0 else False
+        strip_h_sub = params.get('strip_h', 0) // step
+        strip_v_sub = params.get('strip_v', 0) // step
 
-        raw_results = []
-        row_max_stats = [];
-        col_max_stats = []
+        ch_rows = np.array([len(p[2]) for p in profiles])
+        ch_cols = np.array([len(p[3]) for p in profiles])
 
-        full_row_diff = np.zeros(h, dtype=np.float32)
-        full_row_avg = np.zeros(h, dtype=np.float32)
-        full_col_diff = np.zeros(w, dtype=np.float32)
-        full_col_avg = np.zeros(w, dtype=np.float32)
+        # 所有通道的行/列曲线各一次批量差分
+        row_diff_mat = LineDefectAlgorithm._batched_diffs(
+            LineDefectAlgorithm._stack_profiles([p[2] for p in profiles]), ch_rows, edge_gain, use_robust, workers)
+        col_diff_mat = LineDefectAlgorithm._batched_diffs(
+            LineDefectAlgorithm._stack_profiles([p[3] for p in profiles]), ch_cols, edge_gain, use_robust, workers)
+
+        for ch_idx in range(len(profiles)):
+            ch_h, ch_w = ch_rows[ch_idx], ch_cols[ch_idx]
+            if strip_h_sub > 0 and strip_h_sub * 2 < ch_h:
+                row_diff_mat[ch_idx, :strip_h_sub] = 0;
+                row_diff_mat[ch_idx, ch_h - strip_h_sub:ch_h] = 0
+            if strip_v_sub > 0 and strip_v_sub * 2 < ch_w:
+                col_diff_mat[ch_idx, :strip_v_sub] = 0;
+                col_diff_mat[ch_idx, ch_w - strip_v_sub:ch_w] = 0
+
+        return {
+            'h': h, 'w': w, 'step': step, 'profiles': profiles,
+            'ch_rows': ch_rows, 'ch_cols': ch_cols,
+            'row_diffs': row_diff_mat, 'col_diffs': col_diff_mat
+        }
+
+    # 🟢 [新增] Part 差分矩阵 (与阈值无关, 可缓存): 所有通道、所有 Block 一次投影 (行/列同时) + 每方向一次批量差分
+    @staticmethod
+    def compute_part_diffs(img_proc, params, global_diffs, lut=None, workers=1):
+        blk_profiles = LineDefectAlgorithm.compute_block_profiles(
+            img_proc, params.get('channel_count', 4), params.get('block_qty', 10), workers, lut)
+        return LineDefectAlgorithm.part_diffs_from_profiles(*blk_profiles, params, global_diffs, workers)
+
+    # 🟢 [新增] 由 Block 投影求 Part 差分矩阵 (单帧投影与多帧平均投影共用)
+    @staticmethod
+    def part_diffs_from_profiles(blk_row_avgs, blk_col_avgs, blk_h, blk_w, params, global_diffs, workers=1):
+        step = global_diffs['step']
+        edge_gain = params.get('edge_gain', 1.0)
+        use_robust = True if params.get('use_robust', 0) > 0 else False
+        strip_h_sub = params.get('strip_h', 0) // step
+        strip_v_sub = params.get('strip_v', 0) // step
+
+        part = {'blk_h': blk_h, 'blk_w': blk_w, 'row_diffs': None, 'col_diffs': None}
+        if blk_row_avgs.shape[3] > 0:
+            part['row_diffs'] = LineDefectAlgorithm._part_block_diffs(
+                blk_row_avgs, blk_h, global_diffs['ch_rows'], strip_h_sub, True, edge_gain, use_robust, workers)
+            part['col_diffs'] = LineDefectAlgorithm._part_block_diffs(
+                blk_col_avgs, blk_w, global_diffs['ch_cols'], strip_v_sub, False, edge_gain, use_robust, workers)
+        return part
+
+    # 🟢 [新增] 缺陷记录构造: 各字段等长数组 -> DEFECT_DTYPE 结构化数组
+    @staticmethod
+    def _make_records(ch, d_type, is_global, block_y, block_x, index, diff):
+        rec = np.empty(len(index), dtype=DEFECT_DTYPE)
+        rec['ch'] = ch;
+        rec['type'] = d_type;
+        rec['is_global'] = is_global
+        rec['block_y'] = block_y;
+        rec['block_x'] = block_x
+        rec['index'] = index;
+        rec['diff'] = diff
+        return rec
+
+    # 🟢 [新增] Top-K 候选: 每行 (通道) 最多保留 k 个 Diff 最大的命中 (argpartition 部分选择, 不做全排序)
+    #           k <= 0 表示不限; 返回按 (行, 列) 排列的命中坐标, 与 np.nonzero 相同
+    @staticmethod
+    def _top_k_hits(diff_mat, mask, k):
+        if k <= 0 or k >= diff_mat.shape[1] or not mask.any() or mask.sum(axis=1).max() <= k:
+            return np.nonzero(mask)
+        vals = np.where(mask, diff_mat, -np.inf)
+        top = np.argpartition(vals, diff_mat.shape[1] - k, axis=1)[:, -k:]
+        keep = np.zeros(mask.shape, dtype=bool)
+        np.put_along_axis(keep, top, True, axis=1)
+        return np.nonzero(keep & mask)
+
+    # 🟢 [新增] Global 命中: 差分矩阵 (ch, max_len) 一次比较, 每通道保留 Top-K
+    @staticmethod
+    def _global_records(diff_mat, lengths, offsets, step, thresh, d_type, k=100):
+        valid = np.arange(diff_mat.shape[1])[None, :] < lengths[:, None]
+        hit_ch, hit_pos = LineDefectAlgorithm._top_k_hits(diff_mat, (diff_mat > thresh) & valid, k)
+        return LineDefectAlgorithm._make_records(hit_ch, d_type, True, -1, -1,
+                                                 hit_pos * step + offsets[hit_ch], diff_mat[hit_ch, hit_pos])
+
+    # 🟢 [新增] Part 命中: Block 差分矩阵 (ch, by, bx, pos) 一次比较, 每通道 (所有 Block 合计) 保留 Top-K
+    @staticmethod
+    def _part_records(blk_diffs, blk_len, offsets, step, thresh, d_type, k=100):
+        flat = blk_diffs.reshape(len(blk_diffs), -1)
+        hit_ch, hit_flat = LineDefectAlgorithm._top_k_hits(flat, flat > thresh, k)
+        hit_by, hit_bx, hit_pos = np.unravel_index(hit_flat, blk_diffs.shape[1:])
+        blk_idx = hit_by if d_type == DEFECT_H else hit_bx
+        return LineDefectAlgorithm._make_records(hit_ch, d_type, False, hit_by, hit_bx,
+                                                 (blk_idx * blk_len[hit_ch] + hit_pos) * step + offsets[hit_ch],
+                                                 blk_diffs[hit_ch, hit_by, hit_bx, hit_pos])
+
+    # 🟢 [新增] 向量化去重: 同 (type, index) 只留一条 (Global > Part, 其次 Diff 最大, 同分取先出现者)
+    #           结果按 (Global 优先, index) 排序
+    @staticmethod
+    def dedup_defects(records):
+        order = np.lexsort((np.arange(len(records)), -records['diff'], ~records['is_global'],
+                            records['index'], records['type']))
+        rec = records[order]
+        first = np.ones(len(rec), dtype=bool)
+        first[1:] = (rec['type'][1:] != rec['type'][:-1]) | (rec['index'][1:] != rec['index'][:-1])
+        rec = rec[first]
+        return rec[np.lexsort((rec['type'], rec['index'], ~rec['is_global']))]
+
+    # 🟢 [新增] 字典视图 (表格/导出等 UI 代码沿用 d['type'] / d['mode'] 等键)
+    @staticmethod
+    def defect_dicts(records):
+        out = []
+        for ch, t, g, by, bx, idx, diff in records.tolist():
+            out.append({
+                'ch': ch, 'type': DEFECT_TYPES[t], 'mode': 'Global' if g else f'Part({by},{bx})',
+                'index': idx, 'diff': diff, 'is_global': g, 'block_y': by, 'block_x': bx
+            })
+        return out
+
+    # 🟢 [新增] 阈值判定: 只做比较/去重, 毫秒级 (拖动阈值时实时调用)
+    @staticmethod
+    def evaluate_thresholds(global_diffs, part_diffs, params):
+        h, w, step = global_diffs['h'], global_diffs['w'], global_diffs['step']
+        profiles = global_diffs['profiles']
+        y_offs = np.array([p[0] for p in profiles], dtype=np.int64)
+        x_offs = np.array([p[1] for p in profiles], dtype=np.int64)
 
         # Params extraction
         th_g_h = params.get('thresh_global_h', 10.0)
         th_g_v = params.get('thresh_global_v', 10.0)
         th_p_h = params.get('thresh_part_h', 5.0)
         th_p_v = params.get('thresh_part_v', 5.0)
-        edge_gain = params.get('edge_gain', 1.0)
-        use_robust = True if params.get('use_robust', 0) > 0 else False
-
-        strip_h_sub = params.get('strip_h', 0) // step
-        strip_v_sub = params.get('strip_v', 0) // step
+        top_k = params.get('top_k', 100)
+
+        batches = [
+            LineDefectAlgorithm._global_records(global_diffs['row_diffs'], global_diffs['ch_rows'], y_offs, step,
+                                                th_g_h, DEFECT_H, top_k),
+            LineDefectAlgorithm._global_records(global_diffs['col_diffs'], global_diffs['ch_cols'], x_offs, step,
+                                                th_g_v, DEFECT_V, top_k)
+        ]
+        if part_diffs['row_diffs'] is not None:
+            batches.append(LineDefectAlgorithm._part_records(part_diffs['row_diffs'], part_diffs['blk_h'], y_offs,
+                                                             step, th_p_h, DEFECT_H, top_k))
+            batches.append(LineDefectAlgorithm._part_records(part_diffs['col_diffs'], part_diffs['blk_w'], x_offs,
+                                                             step, th_p_v, DEFECT_V, top_k))
+        final_res = LineDefectAlgorithm.dedup_defects(np.concatenate(batches))
+
+        # 全图曲线 (各通道交织回原坐标)
+        row_max_stats = [];
+        col_max_stats = []
+        full_row_diff = np.zeros(h, dtype=np.float32)
+        full_row_avg = np.zeros(h, dtype=np.float32)
+        full_col_diff = np.zeros(w, dtype=np.float32)
+        full_col_avg = np.zeros(w, dtype=np.float32)
 
-        for ch_idx, ch_img in enumerate(channels):
-            if ch_img.size == 0:
+        for ch_idx, (y_off, x_off, row_avgs, col_avgs) in enumerate(profiles):
+            if len(row_avgs) == 0:
                 row_max_stats.append(0);
                 col_max_stats.append(0)
                 continue
 
-            y_off, x_off = channel_offsets[ch_idx]
-            ch_h, ch_w = ch_img.shape
-
-            row_avgs = np.mean(ch_img, axis=1).astype(np.float32)
-            col_avgs = np.mean(ch_img, axis=0).astype(np.float32)
-
-            # --- Row ---
-            row_diffs = _numba_calc_neighbor_diff_robust(row_avgs, float(edge_gain), use_robust)
-            if strip_h_sub > 0 and strip_h_sub * 2 < ch_h:
-                row_diffs[:strip_h_sub] = 0;
-                row_diffs[-strip_h_sub:] = 0
-
+            row_diffs = global_diffs['row_diffs'][ch_idx, :len(row_avgs)]
             iy = np.arange(y_off, h, step)[:len(row_diffs)]
             full_row_diff[iy] = np.maximum(full_row_diff[iy], row_diffs)
             full_row_avg[iy] = row_avgs
             row_max_stats.append(np.max(row_diffs) if len(row_diffs) else 0)
 
-            bad_r = np.where(row_diffs > th_g_h)[0]
-            if len(bad_r) > 100: bad_r = bad_r[:100]
-            for ri in bad_r:
-                raw_results.append({
-                    'ch': ch_idx, 'type': 'Horizontal', 'mode': 'Global',
-                    'index': ri * step + y_off, 'diff': row_diffs[ri]
-                })
-
-            # --- Col ---
-            col_diffs = _numba_calc_neighbor_diff_robust(col_avgs, float(edge_gain), use_robust)
-            if strip_v_sub > 0 and strip_v_sub * 2 < ch_w:
-                col_diffs[:strip_v_sub] = 0;
-                col_diffs[-strip_v_sub:] = 0
-
+            col_diffs = global_diffs['col_diffs'][ch_idx, :len(col_avgs)]
             ix = np.arange(x_off, w, step)[:len(col_diffs)]
             full_col_diff[ix] = np.maximum(full_col_diff[ix], col_diffs)
             full_col_avg[ix] = col_avgs
             col_max_stats.append(np.max(col_diffs) if len(col_diffs) else 0)
 
-            bad_c = np.where(col_diffs > th_g_v)[0]
-            if len(bad_c) > 100: bad_c = bad_c[:100]
-            for ci in bad_c:
-                raw_results.append({
-                    'ch': ch_idx, 'type': 'Vertical', 'mode': 'Global',
-                    'index': ci * step + x_off, 'diff': col_diffs[ci]
-                })
-
-            # --- Part ---
-            block_n = params.get('block_qty', 10)
-            if block_n > 0:
-                bh, bw = ch_h // block_n, ch_w // block_n
-                if bh > 8 and bw > 8:
-                    for by in range(block_n):
-                        for bx in range(block_n):
-                            y0, y1 = by * bh, (by + 1) * bh
-                            if strip_h_sub > 0:
-                                if y1 <= strip_h_sub or y0 >= (ch_h - strip_h_sub): continue
-
-                            sub_b = ch_img[y0:y1, bx * bw:(bx + 1) * bw]
-                            sub_avg = np.mean(sub_b, 1).astype(np.float32)
-                            sub_d = _numba_calc_neighbor_diff_robust(sub_avg, float(edge_gain), use_robust)
-
-                            bad_sub = np.where(sub_d > th_p_h)[0]
-                            for si in bad_sub:
-                                gy = (y0 + si) * step + y_off
-                                raw_results.append({
-                                    'ch': ch_idx, 'type': 'Horizontal', 'mode': f'Part({by},{bx})',
-                                    'index': gy, 'diff': sub_d[si]
-                                })
-
-        # Deduplicate: Global > Part, then Max Diff
-        merged = {}
-        for r in raw_results:
-            k = (r['type'], r['index'])
-            if k not in merged:
-                merged[k] = r
-            else:
-                curr = merged[k]
-                if r['mode'] == 'Global' and curr['mode'] != 'Global':
-                    merged[k] = r
-                elif r['mode'] != 'Global' and curr['mode'] == 'Global':
-                    pass
-                elif r['diff'] > curr['diff']:
-                    merged[k] = r
-
-        final_res = list(merged.values())
-        final_res.sort(key=lambda x: (0 if x['mode'] == 'Global' else 1, x['index']))
-
         stats = {
             'row_diff': full_row_diff, 'row_avg': full_row_avg,
             'col_diff': full_col_diff, 'col_avg': full_col_avg,
-            'row_max': row_max_stats, 'col_max': col_max_stats
+            'row_max': row_max_stats, 'col_max': col_max_stats,
+            'channels': LineDefectAlgorithm.channel_stats(global_diffs)
         }
-        return final_res, stats
\ No newline at end of file
+        return final_res, stats
+
+    # 🟢 [新增] 各通道曲线 (通道 × 长度, 通道坐标; 第 i 点对应原图 i*step + offset), 供分通道叠加显示
+    @staticmethod
+    def channel_stats(global_diffs):
+        profiles = global_diffs['profiles']
+        if 'row_avgs' not in global_diffs:  # 缓存条目中只堆叠一次
+            global_diffs['row_avgs'] = LineDefectAlgorithm._stack_profiles([p[2] for p in profiles])
+            global_diffs['col_avgs'] = LineDefectAlgorithm._stack_profiles([p[3] for p in profiles])
+        return {
+            'step': global_diffs['step'],
+            'offsets': np.array([(p[0], p[1]) for p in profiles], dtype=np.int64).reshape(-1, 2),
+            'rows': global_diffs['ch_rows'], 'cols': global_diffs['ch_cols'],
+            'row_avg': global_diffs['row_avgs'], 'row_diff': global_diffs['row_diffs'],
+            'col_avg': global_diffs['col_avgs'], 'col_diff': global_diffs['col_diffs']
+        }
+
+    @staticmethod
+    def run_inspection(img_input, params, is_preprocessed=False, cache=None):
+        """cache: DiffProfileCache, 同一图像且非阈值参数不变时跳过还原/投影/差分, 只重新比较阈值"""
+        workers = resolve_workers(params)
+
+        # 1. 如果 UI 还没预处理，位深还原融合进投影内核 (查表逐像素完成, 不生成整幅还原图)；如果已处理，跳过
+        #    大端 raw 以本机字节序视图读取, 字节交换并入查找表 (memmap 输入全程零拷贝)
+        img_src, lut = input_view(img_input, None if is_preprocessed else params.get('effective_bits', 16))
+
+        # 2. 差分曲线 (与阈值无关)；Part 另按 block_qty 单独缓存, 改 Block 数不必重算 Global
+        g_key = ('global', is_preprocessed,
+                 None if is_preprocessed else params.get('effective_bits', 16),
+                 params.get('channel_count', 4), float(params.get('edge_gain', 1.0)),
+                 params.get('use_robust', 0) > 0, params.get('strip_h', 0), params.get('strip_v', 0))
+        p_key = g_key + ('part', params.get('block_qty', 10))
+
+        def build_global():
+            return LineDefectAlgorithm.compute_global_diffs(img_src, params, lut, workers)
+
+        global_diffs = cache.lookup(img_input, g_key, build_global) if cache is not None else build_global()
+
+        def build_part():
+            return LineDefectAlgorithm.compute_part_diffs(img_src, params, global_diffs, lut, workers)
+
+        part_diffs = cache.lookup(img_input, p_key, build_part) if cache is not None else build_part()
+
+        # 3. 阈值判定 (返回 DEFECT_DTYPE 结构化数组, UI 侧用 defect_dicts() 取字典视图)
+        return LineDefectAlgorithm.evaluate_thresholds(global_diffs, part_diffs, params)
+
+    # 🟢 [新增] ROI 检测: 左上角对齐到通道周期 (通道相位与整图一致), 结果换算回整图坐标
+    @staticmethod
+    def align_roi(x, y, w, h, img_h, img_w, channel_count):
+        """裁剪到图像范围并把左上角向下对齐到 step 的整数倍, 返回 (x0, y0, w, h); 区域过小返回 None"""
+        step = int(np.sqrt(channel_count))
+        x0, y0 = max(0, int(x)) // step * step, max(0, int(y)) // step * step
+        x1, y1 = min(img_w, int(x + w)), min(img_h, int(y + h))
+        if x1 - x0 < 2 * step or y1 - y0 < 2 * step: return None
+        return x0, y0, x1 - x0, y1 - y0
+
+    @staticmethod
+    def inspect_roi(img_input, x, y, w, h, params):
+        """对 img[y:y+h, x:x+w] 单独检测 (Global = ROI 内整体); 缺陷 index 与通道曲线偏移为整图坐标,
+        Part 的 block_y/block_x 为 ROI 内的 Block 编号。stats['roi'] = 实际检测的 (x0, y0, w, h)"""
+        roi = LineDefectAlgorithm.align_roi(x, y, w, h, *img_input.shape[:2], params.get('channel_count', 4))
+        if roi is None: return None
+        x0, y0, rw, rh = roi
+        records, stats = LineDefectAlgorithm.run_inspection(img_input[y0:y0 + rh, x0:x0 + rw], params)
+        records['index'] += np.where(records['type'] == DEFECT_H, y0, x0).astype(records['index'].dtype)
+        stats['channels']['offsets'] = stats['channels']['offsets'] + (y0, x0)
+        stats['roi'] = roi
+        return records, stats
+
+    # 🟢 [新增] 多帧平均检测: 逐帧流式累加投影曲线 (不保存帧), 在平均曲线上判定
+    @staticmethod
+    def run_stacked_inspection(frames, params, is_preprocessed=False):
+        """frames: 可迭代的同尺寸帧 (如 FrameSource); 返回 (records, stats), stats['frames'] 为平均帧数"""
+        stack = ProfileStack(params, is_preprocessed)
+        for img in frames:
+            stack.add(img)
+        return stack.inspect(params)
+
+
+# ==============================================================================
+# 🟢 4. IntegralProfileIndex (ROI 即时统计)
+# ==============================================================================
+class IntegralProfileIndex:
+    """对还原后的整图建立一次前缀和索引, 任意矩形的各通道行/列均值曲线以 O(h + w) 查询得到。
+    内存约为原图的 4 倍 (两张 uint32 前缀表)。"""
+
+    def __init__(self, img_proc, ch_total, lut=None):
+        """lut 不为空时 img_proc 视为原始图, 建索引时逐像素查表还原"""
+        self.ch_total = ch_total
+        self.step = int(np.sqrt(ch_total))
+        self.h, self.w = img_proc.shape[:2]
+        self.row_prefix, self.col_prefix = _numba_build_profile_index(*_src_args(img_proc), *_lut_args(lut),
+                                                                      self.step)
+
+    def channel_profiles(self, x, y, w, h):
+        """与 compute_channel_profiles(img[y:y+h, x:x+w]) 结果一致, 通道相位以 ROI 左上角为原点"""
+        step = self.step
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(self.w, int(x + w)), min(self.h, int(y + h))
+
+        profiles = []
+        for ly in range(step):
+            rows = np.arange(y0 + ly, y1, step)
+            for lx in range(step):
+                cols = np.arange(x0 + lx, x1, step)
+                if len(rows) == 0 or len(cols) == 0:
+                    empty = np.zeros(0, dtype=np.float32)
+                    profiles.append((ly, lx, empty, empty))
+                    continue
+                j_end = cols[0] + len(cols) * step
+                i_end = rows[0] + len(rows) * step
+                r_sum = self.row_prefix[rows, j_end] - self.row_prefix[rows, cols[0]]
+                c_sum = self.col_prefix[i_end, cols] - self.col_prefix[rows[0], cols]
+                profiles.append((ly, lx, (r_sum / len(cols)).astype(np.float32),
+                                 (c_sum / len(rows)).astype(np.float32)))
+        return profiles
+
+    def roi_statistics(self, x, y, w, h, params):
+        """等价于 compute_roi_statistics(img[y:y+h, x:x+w], params), 但不扫描像素"""
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        rw, rh = min(self.w, int(x + w)) - x0, min(self.h, int(y + h)) - y0
+        if rw <= 0 or rh <= 0: return None
+        profiles = self.channel_profiles(x0, y0, rw, rh)
+        return LineDefectAlgorithm.merge_roi_profiles(profiles, rh, rw, params)
+
+
+# ==============================================================================
+# 🟢 5. DiffProfileCache (阈值实时重判)
+# ==============================================================================
+class DiffProfileCache:
+    """按 (图像对象, 非阈值参数) 缓存差分曲线与 Block 差分矩阵。
+    图像以对象本身识别 (缓存持有引用, 不会被回收复用 id), 最多保留 max_images 张图, 先进先出。"""
+
+    def __init__(self, max_images=2):
+        self.max_images = max_images
+        self._entries = []  # [(img, {key: value}), ...]
+
+    def lookup(self, img, key, build):
+        for entry_img, values in self._entries:
+            if entry_img is img:
+                break
+        else:
+            values = {}
+            self._entries.append((img, values))
+            if len(self._entries) > self.max_images:
+                self._entries.pop(0)
+
+        if key not in values:
+            values[key] = build()
+        return values[key]
+
+    def clear(self):
+        self._entries = []
+
+
+# ==============================================================================
+# 🟢 6. MipiPackedFrame (MIPI CSI-2 打包 RAW 帧, 检测时逐行解包)
+# ==============================================================================
+class MipiPackedFrame:
+    """打包字节 (h, stride) + 像素宽度/位深, 对外表现为 (h, width) 的 uint16 图:
+    run_inspection / IntegralProfileIndex 的投影内核直接读打包数据 (不生成解包图);
+    切片 (img[y, x], img[y0:y1, x0:x1]) 只解包涉及的行, np.asarray() 解包整幅。
+    解包值即传感器码值, 检测/还原时忽略 effective_bits (按 16-bit 处理)"""
+    ndim = 2
+    dtype = np.dtype(np.uint16)
+
+    def __init__(self, packed, width, bits):
+        if bits not in (10, 12, 14):
+            raise ValueError(f"MIPI packing supports RAW10/12/14, got {bits}")
+        need = MipiPackedFrame.line_bytes(width, bits)
+        if packed.ndim != 2 or packed.dtype != np.uint8 or packed.shape[1] < need:
+            raise ValueError(f"RAW{bits} line of {width} px needs {need} bytes, got {packed.shape}")
+        self.packed = packed
+        self.bits = bits
+        self.shape = (packed.shape[0], width)
+
+    @staticmethod
+    def line_bytes(width, bits):
+        n = 2 if bits == 12 else 4
+        return (width + n - 1) // n * (n * bits // 8)
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+    def unpack(self, workers=1, out=None):
+        return LineDefectAlgorithm.unpack_mipi(self.packed, self.shape[1], self.bits, workers, out)
+
+    def __array__(self, dtype=None, copy=None):
+        img = self.unpack()
+        return img if dtype is None else img.astype(dtype)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        rows = self.packed[key[0]]
+        if rows.ndim == 1:
+            return LineDefectAlgorithm.unpack_mipi(rows[None], self.shape[1], self.bits)[0][key[1:]]
+        return LineDefectAlgorithm.unpack_mipi(rows, self.shape[1], self.bits)[(slice(None),) + key[1:]]
+
+
+# ==============================================================================
+# 🟢 7. ProfileStack (多帧时间平均, 弱线缺陷)
+# ==============================================================================
+class ProfileStack:
+    """逐帧累加各通道行/列均值曲线与 Block 投影 (float64), 只保存 1D 曲线, 内存与帧数无关。
+    检测在 N 帧平均曲线上进行, 时间随机噪声约降低 √N; 固定图形噪声 (FPN) 线缺陷不受平均影响。
+    累加只依赖位深 / 通道数 / Block 数 (stack_key), 其余参数 (阈值、边缘增益、裁边) 可随时重新判定。"""
+
+    def __init__(self, params, is_preprocessed=False):
+        self.params = dict(params)
+        self.is_preprocessed = is_preprocessed
+        self.workers = resolve_workers(params)
+        self.count = 0
+        self.shape = None
+        self._offsets = None  # [(y_off, x_off), ...]
+        self._lengths = None  # (ch_rows, ch_cols)
+        self._row_sum = self._col_sum = None  # (ch, max_len) 各帧均值曲线之和
+        self._blk_row_sum = self._blk_col_sum = None
+        self._blk_hw = None
+        self._diffs = {}  # 非阈值参数 -> (global_diffs, part_diffs), 加帧后失效
+
+    @staticmethod
+    def stack_key(params, is_preprocessed=False):
+        return (is_preprocessed, None if is_preprocessed else params.get('effective_bits', 16),
+                params.get('channel_count', 4), params.get('block_qty', 10))
+
+    def matches(self, params):
+        """params 下的累加结果与当前是否一致 (否则需重新累加)"""
+        return self.stack_key(params, self.is_preprocessed) == self.stack_key(self.params, self.is_preprocessed)
+
+    def add(self, img_input):
+        if self.shape is None:
+            self.shape = img_input.shape[:2]
+        elif img_input.shape[:2] != self.shape:
+            raise ValueError(f"Frame size {img_input.shape[:2]} differs from stack {self.shape}")
+        params = self.params
+        ch_total = params.get('channel_count', 4)
+        img_src, lut = input_view(img_input, None if self.is_preprocessed else params.get('effective_bits', 16))
+
+        profiles = LineDefectAlgorithm.compute_channel_profiles(img_src, ch_total, self.workers, lut)
+        rows = LineDefectAlgorithm._stack_profiles([p[2] for p in profiles])
+        cols = LineDefectAlgorithm._stack_profiles([p[3] for p in profiles])
+        blk_rows, blk_cols, blk_h, blk_w = LineDefectAlgorithm.compute_block_profiles(
+            img_src, ch_total, params.get('block_qty', 10), self.workers, lut)
+
+        if self.count == 0:
+            self._offsets = [(p[0], p[1]) for p in profiles]
+            self._lengths = ([len(p[2]) for p in profiles], [len(p[3]) for p in profiles])
+            self._row_sum, self._col_sum = rows.astype(np.float64), cols.astype(np.float64)
+            self._blk_row_sum, self._blk_col_sum = blk_rows.astype(np.float64), blk_cols.astype(np.float64)
+            self._blk_hw = (blk_h, blk_w)
+        else:
+            self._row_sum += rows
+            self._col_sum += cols
+            self._blk_row_sum += blk_rows
+            self._blk_col_sum += blk_cols
+        self.count += 1
+        self._diffs = {}
+
+    def profiles(self):
+        """平均曲线, 格式同 compute_channel_profiles"""
+        n = max(self.count, 1)
+        return [(y, x, (self._row_sum[k, :r] / n).astype(np.float32), (self._col_sum[k, :c] / n).astype(np.float32))
+                for k, ((y, x), r, c) in enumerate(zip(self._offsets, *self._lengths))]
+
+    def inspect(self, params=None):
+        """在平均曲线上判定, 返回 (records, stats) 同 run_inspection; 通道数 / 位深 / Block 数须与累加时一致"""
+        params = self.params if params is None else params
+        if self.count == 0: raise ValueError("ProfileStack is empty")
+        if not self.matches(params): raise ValueError("Stack was accumulated with different bits/channels/blocks")
+        key = (float(params.get('edge_gain', 1.0)), params.get('use_robust', 0) > 0,
+               params.get('strip_h', 0), params.get('strip_v', 0))
+        if key not in self._diffs:
+            n = self.count
+            global_diffs = LineDefectAlgorithm.global_diffs_from_profiles(self.profiles(), *self.shape, params,
+                                                                          self.workers)
+            part_diffs = LineDefectAlgorithm.part_diffs_from_profiles(
+                (self._blk_row_sum / n).astype(np.float32), (self._blk_col_sum / n).astype(np.float32),
+                *self._blk_hw, params, global_diffs, self.workers)
+            self._diffs[key] = (global_diffs, part_diffs)
+        records, stats = LineDefectAlgorithm.evaluate_thresholds(*self._diffs[key], params)
+        stats['frames'] = self.count
+        return records, stats
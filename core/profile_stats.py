@@ -0,0 +1,122 @@
+import os
+import numpy as np
+
+from core.line_algorithm import LineDefectAlgorithm, input_view, resolve_workers
+
+# run_inspection 的 stats['channels'] 中本模块用到的字段 (批量子进程只回传这些, 每帧 O(w + h))
+PROFILE_KEYS = ('step', 'offsets', 'rows', 'cols', 'row_avg', 'col_avg')
+
+
+# ==============================================================================
+# 🟢 批次 (Lot) 级逐行/逐列统计: 各通道行/列均值曲线的 Welford 流式均值与方差
+#    状态只有 (通道 × 行/列) 的 mean / M2, 与帧数无关; 按 flush_every 帧原子写入 .npz, 可中断后续跑
+# ==============================================================================
+class ProfileStatistics:
+    """逐帧加入 stats['channels'] (或直接加入图像), 累计每个通道每行/每列均值的跨帧均值与时间方差。
+    mean 即批次的行/列 FPN 曲线, 方差为其帧间波动 (时间噪声); 所有帧尺寸与通道数须一致。"""
+
+    def __init__(self, path=None, flush_every=1):
+        self.path = path
+        self.flush_every = max(int(flush_every), 1)
+        self.count = 0
+        self.step = 0
+        self.offsets = self.rows = self.cols = None
+        self.row_mean = self.row_m2 = None  # (ch, max_rows) float64
+        self.col_mean = self.col_m2 = None  # (ch, max_cols) float64
+
+    @property
+    def shape(self):
+        """对应的图像尺寸 (h, w), 由通道偏移与曲线长度推出"""
+        if self.count == 0: return None
+        return (int(np.max(self.offsets[:, 0] + (self.rows - 1) * self.step)) + 1,
+                int(np.max(self.offsets[:, 1] + (self.cols - 1) * self.step)) + 1)
+
+    def add(self, channels):
+        """加入一帧: channels 为 run_inspection 返回的 stats['channels'] (至少含 PROFILE_KEYS)"""
+        row_avg = np.asarray(channels['row_avg'], dtype=np.float64)
+        col_avg = np.asarray(channels['col_avg'], dtype=np.float64)
+        if self.count == 0:
+            self.step = int(channels['step'])
+            self.offsets = np.asarray(channels['offsets'], dtype=np.int64).reshape(-1, 2)
+            self.rows = np.asarray(channels['rows'], dtype=np.int64)
+            self.cols = np.asarray(channels['cols'], dtype=np.int64)
+            self.row_mean, self.row_m2 = np.zeros_like(row_avg), np.zeros_like(row_avg)
+            self.col_mean, self.col_m2 = np.zeros_like(col_avg), np.zeros_like(col_avg)
+        elif (int(channels['step']) != self.step or not np.array_equal(channels['rows'], self.rows)
+              or not np.array_equal(channels['cols'], self.cols)):
+            raise ValueError("Frame size or channel count differs from the accumulated lot")
+
+        # Welford: 补零部分 (短通道) 恒为 0, 不影响有效长度内的结果
+        self.count += 1
+        for x, mean, m2 in ((row_avg, self.row_mean, self.row_m2), (col_avg, self.col_mean, self.col_m2)):
+            delta = x - mean
+            mean += delta / self.count
+            m2 += delta * (x - mean)
+
+        if self.path and self.count % self.flush_every == 0:
+            self.save()
+
+    def add_image(self, img_input, params):
+        """直接由图像加入一帧 (只做 Global 投影, 不做检测)"""
+        ch_total = params.get('channel_count', 4)
+        img_src, lut = input_view(img_input, params.get('effective_bits', 16))
+        profiles = LineDefectAlgorithm.compute_channel_profiles(img_src, ch_total, resolve_workers(params), lut)
+        self.add({
+            'step': int(np.sqrt(ch_total)),
+            'offsets': np.array([(p[0], p[1]) for p in profiles], dtype=np.int64).reshape(-1, 2),
+            'rows': np.array([len(p[2]) for p in profiles]), 'cols': np.array([len(p[3]) for p in profiles]),
+            'row_avg': LineDefectAlgorithm._stack_profiles([p[2] for p in profiles]),
+            'col_avg': LineDefectAlgorithm._stack_profiles([p[3] for p in profiles])
+        })
+
+    def variance(self, ddof=1):
+        """(row_var, col_var), 形状同 row_mean / col_mean; 帧数不足时为 NaN"""
+        n = self.count - ddof
+        if n <= 0:
+            return np.full_like(self.row_m2, np.nan), np.full_like(self.col_m2, np.nan)
+        return self.row_m2 / n, self.col_m2 / n
+
+    def full_maps(self, ddof=1):
+        """各通道交织回原图坐标: row_mean / row_std 长度 h, col_mean / col_std 长度 w"""
+        h, w = self.shape
+        row_var, col_var = self.variance(ddof)
+        out = {k: np.zeros(n, dtype=np.float64) for k, n in
+               (('row_mean', h), ('row_std', h), ('col_mean', w), ('col_std', w))}
+        for k, (y, x) in enumerate(self.offsets):
+            r, c = self.rows[k], self.cols[k]
+            if r == 0 or c == 0: continue
+            # 同一行/列的多个通道 (如 R/Gr) 取平均
+            out['row_mean'][y::self.step][:r] += self.row_mean[k, :r] / self.step
+            out['row_std'][y::self.step][:r] += np.sqrt(row_var[k, :r]) / self.step
+            out['col_mean'][x::self.step][:c] += self.col_mean[k, :c] / self.step
+            out['col_std'][x::self.step][:c] += np.sqrt(col_var[k, :c]) / self.step
+        return out
+
+    # --- 持久化: 先写临时文件再替换, 中途中断不会留下半个文件 ---
+    def save(self, path=None):
+        path = path or self.path
+        if self.count == 0: return path
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, count=self.count, step=self.step, offsets=self.offsets, rows=self.rows, cols=self.cols,
+                     row_mean=self.row_mean, row_m2=self.row_m2, col_mean=self.col_mean, col_m2=self.col_m2)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def open(cls, path, flush_every=1):
+        """文件已存在时读取并继续累计 (批次可分多次运行 / 中断后续跑), 否则新建"""
+        if os.path.exists(path):
+            return cls.load(path, flush_every)
+        return cls(path, flush_every)
+
+    @classmethod
+    def load(cls, path, flush_every=1):
+        """读取已保存的统计 (可继续 add, 后续写回同一文件)"""
+        stats = cls(path, flush_every)
+        with np.load(path) as data:
+            stats.count, stats.step = int(data['count']), int(data['step'])
+            stats.offsets, stats.rows, stats.cols = data['offsets'], data['rows'], data['cols']
+            stats.row_mean, stats.row_m2 = data['row_mean'], data['row_m2']
+            stats.col_mean, stats.col_m2 = data['col_mean'], data['col_m2']
+        return stats
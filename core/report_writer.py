@@ -0,0 +1,119 @@
+import os
+import cv2
+import numpy as np
+import xlsxwriter
+from datetime import datetime
+
+from core.image_io import to_native
+
+
+# ==============================================================================
+# 🟢 1. 缺陷截图 (不依赖 Qt, 批量子进程中直接调用)
+# ==============================================================================
+def crop_defect(img, d, pad, block_qty):
+    """按缺陷位置截取 ±pad 的条带; Part 缺陷只截对应 Block 范围, 纵向缺陷旋转为横向显示"""
+    h, w = img.shape[:2]
+    blk_h, blk_w = h // block_qty if block_qty else h, w // block_qty if block_qty else w
+    idx = d['index']
+    x0, x1, y0, y1 = 0, w, 0, h
+
+    if not d['is_global']:
+        by, bx = d['block_y'], d['block_x']
+        if d['type'] == 'Horizontal':
+            x0, x1 = bx * blk_w, (bx + 1) * blk_w
+        else:
+            y0, y1 = by * blk_h, (by + 1) * blk_h
+
+    if d['type'] == 'Horizontal':
+        crop = img[max(0, idx - pad):min(h, idx + pad), x0:x1]
+    else:
+        crop = img[y0:y1, max(0, idx - pad):min(w, idx + pad)]
+        if crop.size > 0:
+            crop = cv2.rotate(crop, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return crop
+
+
+def save_defect_crops(img, defects, sub_dir, pad, block_qty):
+    """保存每条缺陷的截图 (8-bit PNG), 返回与 defects 一一对应的路径列表 (无截图为空字符串)"""
+    paths = []
+    for di, d in enumerate(defects):
+        crop = to_native(crop_defect(img, d, pad, block_qty))
+        img_path = ""
+        if crop.size > 0:
+            if crop.dtype == np.uint16:
+                vis = cv2.normalize(crop, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            else:
+                vis = crop.astype(np.uint8)
+
+            os.makedirs(sub_dir, exist_ok=True)
+            img_name = f"D{di}_{d['type'][0]}{d['index']}_diff{int(d['diff'])}.png"
+            img_path = os.path.join(sub_dir, img_name)
+            cv2.imwrite(img_path, vis)
+        paths.append(img_path)
+    return paths
+
+
+# ==============================================================================
+# 🟢 2. 批量报告 (Summary + Defect_Details, 逐图追加写入)
+# ==============================================================================
+class BatchReportWriter:
+    def __init__(self, base_dir):
+        time_str = datetime.now().strftime('%H%M%S')
+        self.rep_dir = os.path.join(base_dir, f"Report_{time_str}")
+        self.img_dir = os.path.join(self.rep_dir, "FAIL_Images")
+        os.makedirs(self.img_dir, exist_ok=True)
+
+        self.excel_path = os.path.join(self.rep_dir, f"Batch_Report_{time_str}.xlsx")
+        self.workbook = xlsxwriter.Workbook(self.excel_path)
+
+        self.ws_sum = self.workbook.add_worksheet("Summary")
+        header_fmt = self.workbook.add_format({'bold': True, 'bg_color': '#D3D3D3', 'border': 1})
+        self.cell_fmt = self.workbook.add_format({'border': 1, 'align': 'center', 'valign': 'vcenter'})
+
+        self.ws_sum.write_row('A1', ["Filename", "Result", "Unique Defects", "Time (s)", "Note"], header_fmt)
+        self.ws_sum.set_column('A:A', 30)
+        self.ws_sum.set_column('E:E', 50)
+
+        self.ws_detail = self.workbook.add_worksheet("Defect_Details")
+        self.ws_detail.write_row('A1', ["Filename", "Index", "Type", "Mode", "Channel", "Diff Value", "Image"],
+                                 header_fmt)
+        self.ws_detail.set_column('A:A', 30)
+        self.ws_detail.set_column('B:F', 10)
+        self.ws_detail.set_column('G:G', 50)
+
+        self.sum_row = 1
+        self.detail_row = 1
+        self.fail_count = 0
+
+    def crop_dir(self, file_name):
+        return os.path.join(self.img_dir, os.path.splitext(file_name)[0])
+
+    def add_result(self, file_name, defects, dt, crop_paths=()):
+        res_str = "FAIL" if defects else "PASS"
+        if defects: self.fail_count += 1
+        self.ws_sum.write_row(self.sum_row, 0, [file_name, res_str, len(defects), round(dt, 2)], self.cell_fmt)
+        self.sum_row += 1
+
+        for di, d in enumerate(defects):
+            self.ws_detail.write_row(self.detail_row, 0,
+                                     [file_name, d['index'], d['type'], d['mode'], d['ch'], round(d['diff'], 2)],
+                                     self.cell_fmt)
+            img_path = crop_paths[di] if di < len(crop_paths) else ""
+            if img_path and os.path.exists(img_path):
+                try:
+                    self.ws_detail.set_row(self.detail_row, 100)
+                    self.ws_detail.insert_image(self.detail_row, 6, img_path,
+                                                {'x_scale': 0.5, 'y_scale': 0.5, 'object_position': 1,
+                                                 'x_offset': 5, 'y_offset': 5})
+                except:
+                    pass
+            self.detail_row += 1
+
+    # 🟢 [新增] 读取/检测失败的文件也占一行 (Result = ERROR, Note 为错误信息), 批次继续
+    def add_error(self, file_name, message=""):
+        self.ws_sum.write_row(self.sum_row, 0, [file_name, "ERROR", "", "", message], self.cell_fmt)
+        self.sum_row += 1
+
+    def close(self):
+        self.workbook.close()
+        return self.excel_path
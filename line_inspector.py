@@ -17,22 +17,99 @@ pg.setConfigOptions(imageAxisOrder='row-major', antialias=False, useOpenGL=True)
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QSplitter, QGroupBox,
-    QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox,
+    QSpinBox, QTableView, QHeaderView, QComboBox,
     QDoubleSpinBox, QListWidget, QScrollArea, QFrame, QCheckBox, QMessageBox,
     QProgressBar, QLineEdit, QDialog, QDialogButtonBox, QFormLayout
 )
 from PyQt6.QtCore import Qt, QSize, QRectF, QTimer, QSettings
-from PyQt6.QtGui import QColor, QIcon, QPen
+from PyQt6.QtGui import QIcon
 
 from ui.new_widgets import ZoomableGraphicsView
-from ui.line_widgets import LineProfileWidget
-from core.line_algorithm import LineDefectAlgorithm
+from ui.line_widgets import LineProfileWidget, LineDefectTableModel
+from ui.batch_worker import BatchPipeline
+from ui.roi_worker import RoiInspectWorker
+from core.frame_cache import FrameCache, load_frame
+from core.image_io import raw_format_from_config, to_native, expand_frames, frame_count, FrameSource, FrameReader
+from core.report_writer import BatchReportWriter, crop_defect, save_defect_crops
+from core.batch_inspector import BITS_OPTIONS, CHANNEL_OPTIONS
+from core.profile_stats import ProfileStatistics
+from core.line_algorithm import LineDefectAlgorithm, DiffProfileCache, ProfileStack, MipiPackedFrame, DEFECT_H, \
+    get_restore_lut, resolve_workers
+
+
+# ==============================================================================
+# 🟢 弹窗基类: 批量任务在后台流水线中运行 (进度条实时刷新, 支持暂停/取消)
+# ==============================================================================
+class BatchPipelineDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pipeline = None
+        self.done_text = "Report generated"
+
+    def _add_run_controls(self, layout, on_start):
+        self.pbar = QProgressBar()
+        layout.addWidget(self.pbar)
+
+        h_btn = QHBoxLayout()
+        self.btn_pause = QPushButton("⏸ Pause")
+        self.btn_pause.setCheckable(True)
+        self.btn_pause.setEnabled(False)
+        self.btn_pause.toggled.connect(self._toggle_pause)
+        self.btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.btns.accepted.connect(on_start)
+        self.btns.rejected.connect(self.reject)
+        h_btn.addWidget(self.btn_pause)
+        h_btn.addWidget(self.btns)
+        layout.addLayout(h_btn)
+
+    def _start_pipeline(self, pipeline, done_text):
+        self.pipeline = pipeline
+        self.done_text = done_text
+        self.pbar.setRange(0, len(pipeline.paths))
+        self.pbar.setValue(0)
+        self.btns.button(QDialogButtonBox.StandardButton.Ok).setEnabled(False)
+        self.btn_pause.setEnabled(True)
+        pipeline.sig_progress.connect(self._on_pipeline_progress)
+        pipeline.sig_error.connect(self._on_pipeline_error)
+        pipeline.sig_finished.connect(self._on_pipeline_finished)
+        pipeline.start()
+
+    def _toggle_pause(self, paused):
+        if self.pipeline is None: return
+        self.pipeline.set_paused(paused)
+        self.btn_pause.setText("▶ Resume" if paused else "⏸ Pause")
+
+    def _on_pipeline_progress(self, done, total, path):
+        self.pbar.setValue(done)
+        self.pbar.setFormat(f"%v / %m  {Path(path).name}")
+
+    def _on_pipeline_error(self, msg):
+        QMessageBox.warning(self, "Error", f"Batch stopped:\n{msg}")
+
+    def _on_pipeline_finished(self, out_path, cancelled):
+        self.pipeline.wait()
+        self.pipeline = None
+        if cancelled:
+            QMessageBox.information(self, "Cancelled", f"Partial result saved:\n{out_path}")
+            super().reject()
+        else:
+            QMessageBox.information(self, "Done", f"{self.done_text}:\n{out_path}")
+            self.accept()
+
+    def reject(self):
+        # 运行中: 先取消流水线, 等已完成部分写盘后 (_on_pipeline_finished) 再关闭
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+            self.btns.button(QDialogButtonBox.StandardButton.Cancel).setEnabled(False)
+            self.btn_pause.setEnabled(False)
+            return
+        super().reject()
 
 
 # ==============================================================================
 # 🟢 弹窗 1: 批量坐标截图设置 (Excel 矩阵版)
 # ==============================================================================
-class BatchSnapDialog(QDialog):
+class BatchSnapDialog(BatchPipelineDialog):
     def __init__(self, file_list, default_path, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Batch Coordinate Snapper (Excel Matrix)")
@@ -121,13 +198,7 @@ class BatchSnapDialog(QDialog):
         h_out.addWidget(self.btn_out)
         layout.addWidget(grp_out)
 
-        self.pbar = QProgressBar()
-        layout.addWidget(self.pbar)
-
-        btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-        btns.accepted.connect(self.run_process)
-        btns.rejected.connect(self.reject)
-        layout.addWidget(btns)
+        self._add_run_controls(layout, self.run_process)
 
         self.toggle_mode_ui(0)
 
@@ -198,6 +269,12 @@ class BatchSnapDialog(QDialog):
         if not image_files:
             QMessageBox.warning(self, "Warn", "No images matched!")
             return
+        # 多帧文件 (多页 TIFF / 多帧 raw) 每帧一列, 列名为 "名称#帧号"
+        raw_format = getattr(self.parent(), 'raw_format', None)
+        frames = {os.path.join(os.path.dirname(p), label): (p, k)
+                  for p, k, label in expand_frames(image_files, raw_format)}
+        image_files = list(frames)
+        reader = FrameReader(raw_format)  # 解码线程按顺序读帧, 同一文件只打开/解析一次
 
         base = self.edt_out.text()
         time_str = datetime.now().strftime('%H%M%S')
@@ -238,30 +315,17 @@ class BatchSnapDialog(QDialog):
             worksheet.write(0, col_idx + 1, fname, fmt_header)
             worksheet.set_column(col_idx + 1, col_idx + 1, 40)  # 图片列宽
 
-        # 5. 遍历处理
-        self.pbar.setRange(0, len(image_files))
-
-        # 这里的逻辑稍微反转一下：为了性能，我们按图片遍历（外层），然后切每行（内层）
-        # 但写入 Excel 时，我们要按 (row, col) 写入
+        # 行头 (坐标)
+        for row_idx, (idx, is_horz) in enumerate(tasks):
+            dir_str = "Row (H)" if is_horz else "Col (V)"
+            worksheet.write(row_idx + 1, 0, f"{dir_str} {idx}", fmt_row_header)
+            worksheet.set_row(row_idx + 1, 100)  # 设置行高以容纳图片
 
-        for col_idx, img_path in enumerate(image_files):
-            self.pbar.setValue(col_idx + 1)
-            QApplication.processEvents()
-
-            img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-            if img is None: continue
+        # 5. 后台流水线: 读图 -> 截图 (按图片遍历, 每张图切所有行) -> 写 PNG 并插入 (row, col)
+        def snap(img_path, img):
             h, w = img.shape[:2]
-
-            for row_idx, (idx, is_horz) in enumerate(tasks):
-                # 写入行头 (只在处理第一张图时写一次)
-                if col_idx == 0:
-                    dir_str = "Row (H)" if is_horz else "Col (V)"
-                    label = f"{dir_str} {idx}"
-                    worksheet.write(row_idx + 1, 0, label, fmt_row_header)
-                    worksheet.set_row(row_idx + 1, 100)  # 设置行高以容纳图片
-
-                # 截图逻辑
-                crop = None
+            crops = []
+            for idx, is_horz in tasks:
                 if is_horz:
                     y0, y1 = max(0, idx - pad), min(h, idx + pad)
                     crop = img[y0:y1, :]
@@ -272,35 +336,40 @@ class BatchSnapDialog(QDialog):
                     if crop.size > 0:
                         crop = cv2.rotate(crop, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
-                if crop is not None and crop.size > 0:
+                vis = None
+                crop = to_native(crop)
+                if crop.size > 0:
                     # 转 8-bit 用于保存
                     if crop.dtype == np.uint16:
                         vis = cv2.normalize(crop, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
                     else:
                         vis = crop.astype(np.uint8)
+                crops.append(vis)
+            return crops
+
+        def export(col_idx, img_path, crops):
+            for row_idx, vis in enumerate(crops):
+                if vis is None: continue
+                # 保存临时图片, 命名规则: col_row.png
+                tmp_path = os.path.join(temp_img_dir, f"c{col_idx}_r{row_idx}.png")
+                cv2.imwrite(tmp_path, vis)
+
+                # 插入 Excel
+                worksheet.insert_image(row_idx + 1, col_idx + 1, tmp_path, {
+                    'x_scale': 0.5,
+                    'y_scale': 0.5,
+                    'object_position': 1,  # Move and size with cells
+                    'x_offset': 5,
+                    'y_offset': 5
+                })
+
+        def finish():
+            reader.close()
+            workbook.close()
+            return excel_path
 
-                    # 保存临时图片
-                    # 命名规则: col_row.png
-                    tmp_name = f"c{col_idx}_r{row_idx}.png"
-                    tmp_path = os.path.join(temp_img_dir, tmp_name)
-                    cv2.imwrite(tmp_path, vis)
-
-                    # 插入 Excel
-                    worksheet.insert_image(row_idx + 1, col_idx + 1, tmp_path, {
-                        'x_scale': 0.5,
-                        'y_scale': 0.5,
-                        'object_position': 1,  # Move and size with cells
-                        'x_offset': 5,
-                        'y_offset': 5
-                    })
-
-        workbook.close()
-
-        # 可选：清理临时文件夹 (如果不想要那一堆碎图)
-        # shutil.rmtree(temp_img_dir)
-
-        QMessageBox.information(self, "Done", f"Excel Matrix generated at:\n{excel_path}")
-        self.accept()
+        pipeline = BatchPipeline(image_files, lambda p: reader.read(*frames[p]), snap, export, finish, parent=self)
+        self._start_pipeline(pipeline, "Excel Matrix generated at")
 
     def apply_styles(self):
         self.setStyleSheet("QDialog{background:#1a1a1a;color:#fff} QGroupBox{border:1px solid #444;color:#0e6}")
@@ -308,7 +377,7 @@ class BatchSnapDialog(QDialog):
 # ==============================================================================
 # 🟢 弹窗 2: 批量 Pass/Fail 分析设置
 # ==============================================================================
-class BatchAnalysisDialog(QDialog):
+class BatchAnalysisDialog(BatchPipelineDialog):
     def __init__(self, params, default_path, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Batch Analysis")
@@ -361,14 +430,11 @@ class BatchAnalysisDialog(QDialog):
         self.sb_pad.setValue(20)
         form.addRow("Crop Height (±px):", self.sb_pad)
 
-        layout.addWidget(grp_main)
-        self.pbar = QProgressBar()
-        layout.addWidget(self.pbar)
+        self.chk_lot_stats = QCheckBox("Save per-row/column mean && variance (.npz)")
+        form.addRow("Lot Statistics:", self.chk_lot_stats)
 
-        btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-        btns.accepted.connect(self.run)
-        btns.rejected.connect(self.reject)
-        layout.addWidget(btns)
+        layout.addWidget(grp_main)
+        self._add_run_controls(layout, self.run)
 
     def select_input(self):
         d = QFileDialog.getExistingDirectory(self, "Select Input Directory", self.edt_in.text())
@@ -398,22 +464,6 @@ class BatchAnalysisDialog(QDialog):
         d = QFileDialog.getExistingDirectory(self, "Select Output Directory", self.edt_out.text())
         if d: self.edt_out.setText(d)
 
-    def process_unique_defects(self, raw_defects):
-        line_map = {}
-        for d in raw_defects:
-            key = (d['ch'], d['type'], d['index'])
-            if key not in line_map:
-                line_map[key] = d
-            else:
-                existing = line_map[key]
-                is_existing_global = "Global" in existing['mode']
-                is_new_global = "Global" in d['mode']
-                if is_new_global and not is_existing_global:
-                    line_map[key] = d
-                elif is_new_global == is_existing_global:
-                    if d['diff'] > existing['diff']: line_map[key] = d
-        return sorted(line_map.values(), key=lambda x: x['index'])
-
     def run(self):
         f_list = [x for x in self.file_list if self.txt_filter.text().lower() in Path(x).name.lower()]
         if not f_list:
@@ -421,110 +471,45 @@ class BatchAnalysisDialog(QDialog):
             return
 
         base = self.edt_out.text() if self.edt_out.text() else self.default_path
-        time_str = datetime.now().strftime('%H%M%S')
-        rep_dir = os.path.join(base, f"Report_{time_str}")
-        img_dir = os.path.join(rep_dir, "FAIL_Images")
-        os.makedirs(img_dir, exist_ok=True)
-
-        excel_path = os.path.join(rep_dir, f"Batch_Report_{time_str}.xlsx")
-        workbook = xlsxwriter.Workbook(excel_path)
-
-        ws_sum = workbook.add_worksheet("Summary")
-        header_fmt = workbook.add_format({'bold': True, 'bg_color': '#D3D3D3', 'border': 1})
-        cell_fmt = workbook.add_format({'border': 1, 'align': 'center', 'valign': 'vcenter'})
-
-        ws_sum.write_row('A1', ["Filename", "Result", "Unique Defects", "Time (s)"], header_fmt)
-        ws_sum.set_column('A:A', 30)
-
-        ws_detail = workbook.add_worksheet("Defect_Details")
-        ws_detail.write_row('A1', ["Filename", "Index", "Type", "Mode", "Channel", "Diff Value", "Image"], header_fmt)
-        ws_detail.set_column('A:A', 30)
-        ws_detail.set_column('B:F', 10)
-        ws_detail.set_column('G:G', 50)
-
+        report = BatchReportWriter(base)
         pad = self.sb_pad.value()
-        detail_row = 1
-        block_qty = self.params.get('block_qty', 10)
-
-        self.pbar.setRange(0, len(f_list))
-
-        for i, p in enumerate(f_list):
-            self.pbar.setValue(i + 1)
-            QApplication.processEvents()
-
-            file_name = Path(p).name
-            img = cv2.imread(p, -1)
-            if img is None: continue
-
+        params = dict(self.params)
+        block_qty = params.get('block_qty', 10)
+        # 🟢 [新增] 批次统计: 各通道行/列均值曲线的 Welford 均值/方差, 定期写回输出目录
+        #    (同一输出目录的多次运行继续累计同一个文件)
+        lot = None
+        if self.chk_lot_stats.isChecked():
+            lot = ProfileStatistics.open(os.path.join(base, "Lot_Profile_Stats.npz"), flush_every=16)
+
+        # 后台流水线: 读图 -> 检测 -> 截图并写报告 (三者重叠执行)
+        def inspect(p, img):
             t0 = datetime.now()
-            raw_defects, _ = LineDefectAlgorithm.run_inspection(img, self.params)
-            unique_defects = self.process_unique_defects(raw_defects)
-            dt = (datetime.now() - t0).total_seconds()
-            res_str = "FAIL" if unique_defects else "PASS"
-
-            ws_sum.write_row(i + 1, 0, [file_name, res_str, len(unique_defects), round(dt, 2)], cell_fmt)
-
-            if unique_defects:
-                sub_dir = os.path.join(img_dir, Path(p).stem)
-                os.makedirs(sub_dir, exist_ok=True)
-                h, w = img.shape[:2]
-                blk_h, blk_w = h // block_qty, w // block_qty
-
-                for di, d in enumerate(unique_defects):
-                    idx = d['index']
-                    x0, x1, y0, y1 = 0, w, 0, h
+            records, stats = LineDefectAlgorithm.run_inspection(img, params)
+            defects = LineDefectAlgorithm.defect_dicts(records[np.argsort(records['index'], kind='stable')])
+            return img, defects, (datetime.now() - t0).total_seconds(), stats['channels']
 
-                    if "Part" in d['mode']:
-                        try:
-                            parts = d['mode'].replace("Part(", "").replace(")", "").split(",")
-                            by, bx = int(parts[0]), int(parts[1])
-                            if d['type'] == 'Horizontal':
-                                x0, x1 = bx * blk_w, (bx + 1) * blk_w
-                            else:
-                                y0, y1 = by * blk_h, (by + 1) * blk_h
-                        except:
-                            pass
-
-                    crop = None
-                    if d['type'] == 'Horizontal':
-                        cy0 = max(0, idx - pad)
-                        cy1 = min(h, idx + pad)
-                        crop = img[cy0:cy1, x0:x1]
-                    else:
-                        cx0 = max(0, idx - pad)
-                        cx1 = min(w, idx + pad)
-                        crop = img[y0:y1, cx0:cx1]
-                        if crop.size > 0:
-                            crop = cv2.rotate(crop, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-                    img_path = ""
-                    if crop is not None and crop.size > 0:
-                        if crop.dtype == np.uint16:
-                            vis = cv2.normalize(crop, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-                        else:
-                            vis = crop.astype(np.uint8)
-
-                        img_name = f"D{di}_{d['type'][0]}{idx}_diff{int(d['diff'])}.png"
-                        img_path = os.path.join(sub_dir, img_name)
-                        cv2.imwrite(img_path, vis)
-
-                    ws_detail.write_row(detail_row, 0,
-                                        [file_name, d['index'], d['type'], d['mode'], d['ch'], round(d['diff'], 2)],
-                                        cell_fmt)
-
-                    if img_path and os.path.exists(img_path):
-                        try:
-                            ws_detail.set_row(detail_row, 100)
-                            ws_detail.insert_image(detail_row, 6, img_path,
-                                                   {'x_scale': 0.5, 'y_scale': 0.5, 'object_position': 1, 'x_offset': 5,
-                                                    'y_offset': 5})
-                        except:
-                            pass
-                    detail_row += 1
-
-        workbook.close()
-        QMessageBox.information(self, "Done", f"Report generated:\n{excel_path}")
-        self.accept()
+        def export(i, p, result):
+            img, defects, dt, channels = result
+            file_name = Path(p).name
+            crop_paths = save_defect_crops(img, defects, report.crop_dir(file_name), pad, block_qty)
+            report.add_result(file_name, defects, dt, crop_paths)
+            if lot is not None:
+                try:
+                    lot.add(channels)
+                except ValueError as e:
+                    print(f"Lot statistics skip {file_name}: {e}")
+
+        def finish():
+            reader.close()
+            if lot is not None: lot.save()
+            return report.close()
+
+        # 多帧文件逐帧检测 (每帧一行报告, 名称为 "名称#帧号"); 解码线程每次只读一帧
+        raw_format = getattr(self.parent(), 'raw_format', None)
+        frames = {os.path.join(os.path.dirname(p), label): (p, k) for p, k, label in expand_frames(f_list, raw_format)}
+        reader = FrameReader(raw_format)  # 解码线程按顺序读帧, 同一文件只打开/解析一次
+        pipeline = BatchPipeline(list(frames), lambda p: reader.read(*frames[p]), inspect, export, finish, parent=self)
+        self._start_pipeline(pipeline, "Report generated")
 
     def apply_styles(self):
         self.setStyleSheet("QDialog{background:#1a1a1a;color:#fff} QGroupBox{border:1px solid #444;color:#0e6}")
@@ -540,21 +525,59 @@ class LineInspectorApp(QMainWindow):
         self.resize(1600, 1000)
 
         self.current_img = None
-        self.processed_img = None
-        self.defects = []
+        self.processed_img = None  # 还原图按需生成 (仅导出截图需要), 检测本身走融合查表路径
+        self.last_params = None
+        self.defect_records = None  # DEFECT_DTYPE 结构化数组 (表格模型/叠加层/导出共用)
         self.file_list = []
         self.current_folder = ""
-        self.defect_items = []
         self.last_stats = None
+        self.roi_records = None  # 实时 ROI 模式下当前 ROI 的检测结果 (整图检测结果仍保存在 defect_records)
+        self.roi_rect = None  # 最近一次请求的 ROI (x, y, w, h)
+        self._params = None  # 解析后的参数 (控件变化时置空, 下次读取时重新解析)
+        self._restore_lut = None  # 当前位深的还原查找表 (光标读数用)
+        self.cursor_pos = None  # 最近一次鼠标位置 (读数按刷新率合并更新)
+        self.readout = None  # (stats, x0, y0, ch_at): 光标读数所用的曲线 (整图或当前 ROI)
+        self._restore_buf = None  # 查表还原的复用缓冲区 (同尺寸图像之间复用)
+        self.diff_cache = DiffProfileCache()  # 差分曲线缓存 (调阈值时只重新比较, 不重算投影)
+        self.result_img = None  # 当前检测结果所对应的图像
+        self.frame_stack = None  # 多帧平均检测的累加曲线 (调阈值时直接重新判定)
+        # 浏览缓存: 原图 + 预览 (LRU, 按字节预算), 后台预取前后几张; 键为 (路径, 帧号), .raw 按当前 RAW 格式映射
+        self.frame_cache = FrameCache(loader=lambda key: load_frame(key[0], frame=key[1], reader=self.frame_reader))
+        self.current_path = None
+        self.current_frame = 0
+        self.frame_total = 1  # 当前文件的帧数 (多页 TIFF / 多帧 raw)
+        self.prefetch_radius = 2
         # 🟢 [修改] 1. 使用新的配置加载
         self.config_path = self.get_config_path()  # 获取路径
         self.config = self.load_config()  # 加载或生成 ini
+        self.raw_format = raw_format_from_config(self.config)  # .raw 读取参数 (整体替换, 后台预取线程只读)
+        self.frame_reader = FrameReader(self.raw_format)  # 浏览读帧 (多页 TIFF 保持打开, 逐帧翻页不重复解析目录)
         self.sync_driver = None
         self.chart_sync_timer = QTimer()
         self.chart_sync_timer.setSingleShot(True)
         self.chart_sync_timer.setInterval(20)
         self.chart_sync_timer.timeout.connect(self._execute_chart_driven_sync)
         self.pending_chart_req = None
+        # 🟢 [新增] 阈值实时重判 (防抖, 连续拖动只执行最后一次)
+        self.refilter_timer = QTimer()
+        self.refilter_timer.setSingleShot(True)
+        self.refilter_timer.setInterval(30)
+        self.refilter_timer.timeout.connect(self._refilter_defects)
+        # 🟢 [新增] 实时 ROI 重检 (防抖后交给后台线程; 线程只保留最新请求, 过期结果丢弃)
+        self.roi_timer = QTimer()
+        self.roi_timer.setSingleShot(True)
+        self.roi_timer.setInterval(80)
+        self.roi_timer.timeout.connect(self._submit_roi_request)
+        self.roi_gen = 0
+        self.roi_worker = RoiInspectWorker(self)
+        self.roi_worker.sig_stats.connect(self._on_roi_stats)
+        self.roi_worker.sig_result.connect(self._on_roi_result)
+        self.roi_worker.start()
+        # 🟢 [新增] 光标读数节流: 鼠标移动只记录位置, 每帧 (16ms) 最多刷新一次标签
+        self.cursor_timer = QTimer()
+        self.cursor_timer.setSingleShot(True)
+        self.cursor_timer.setInterval(16)
+        self.cursor_timer.timeout.connect(self._update_cursor_readout)
 
         self.init_ui()
         self.apply_theme()
@@ -584,9 +607,10 @@ class LineInspectorApp(QMainWindow):
                 "effective_bits_idx": 0, "channel_count_idx": 0, "use_robust": True,
                 "thresh_global_h": 20, "thresh_global_v": 20,
                 "thresh_part_h": 10, "thresh_part_v": 10,
-                "block_qty": 10, "strip_h": 0, "strip_v": 0,
+                "block_qty": 10, "top_k": 100, "strip_h": 0, "strip_v": 0,
                 "edge_gain": 1.0, "vis_pad": 5, "crop_pad": 20,
-                "last_folder": ""
+                "workers": 0, "raw_width": 0, "raw_height": 0, "raw_bits": 16,
+                "raw_big_endian": False, "raw_header": 0, "raw_packed": False, "last_folder": ""
             }
             self.save_config(defaults)  # 调用保存生成文件
             return defaults
@@ -601,11 +625,19 @@ class LineInspectorApp(QMainWindow):
         cfg["thresh_part_h"] = int(settings.value("params/thresh_part_h", 10))
         cfg["thresh_part_v"] = int(settings.value("params/thresh_part_v", 10))
         cfg["block_qty"] = int(settings.value("params/block_qty", 10))
+        cfg["top_k"] = int(settings.value("params/top_k", 100))
         cfg["strip_h"] = int(settings.value("crop/strip_h", 0))
         cfg["strip_v"] = int(settings.value("crop/strip_v", 0))
         cfg["edge_gain"] = float(settings.value("params/edge_gain", 1.0))
         cfg["vis_pad"] = int(settings.value("vis/vis_pad", 5))
         cfg["crop_pad"] = int(settings.value("vis/crop_pad", 20))
+        cfg["workers"] = int(settings.value("params/workers", 0))
+        cfg["raw_width"] = int(settings.value("raw/raw_width", 0))
+        cfg["raw_height"] = int(settings.value("raw/raw_height", 0))
+        cfg["raw_bits"] = int(settings.value("raw/raw_bits", 16))
+        cfg["raw_big_endian"] = str(settings.value("raw/raw_big_endian", "false")).lower() == 'true'
+        cfg["raw_header"] = int(settings.value("raw/raw_header", 0))
+        cfg["raw_packed"] = str(settings.value("raw/raw_packed", "false")).lower() == 'true'
         cfg["last_folder"] = settings.value("paths/last_folder", "")
         return cfg
 
@@ -620,11 +652,19 @@ class LineInspectorApp(QMainWindow):
         settings.setValue("params/thresh_part_h", data.get("thresh_part_h", 10))
         settings.setValue("params/thresh_part_v", data.get("thresh_part_v", 10))
         settings.setValue("params/block_qty", data.get("block_qty", 10))
+        settings.setValue("params/top_k", data.get("top_k", 100))
         settings.setValue("crop/strip_h", data.get("strip_h", 0))
         settings.setValue("crop/strip_v", data.get("strip_v", 0))
         settings.setValue("params/edge_gain", data.get("edge_gain", 1.0))
         settings.setValue("vis/vis_pad", data.get("vis_pad", 5))
         settings.setValue("vis/crop_pad", data.get("crop_pad", 20))
+        settings.setValue("params/workers", data.get("workers", 0))
+        settings.setValue("raw/raw_width", data.get("raw_width", 0))
+        settings.setValue("raw/raw_height", data.get("raw_height", 0))
+        settings.setValue("raw/raw_bits", data.get("raw_bits", 16))
+        settings.setValue("raw/raw_big_endian", data.get("raw_big_endian", False))
+        settings.setValue("raw/raw_header", data.get("raw_header", 0))
+        settings.setValue("raw/raw_packed", data.get("raw_packed", False))
         settings.setValue("paths/last_folder", data.get("last_folder", ""))
         settings.sync()  # 强制写入磁盘
     def init_ui(self):
@@ -650,8 +690,23 @@ class LineInspectorApp(QMainWindow):
         v_src.addWidget(self.lbl_info)
         self.list_files = QListWidget()
         self.list_files.setFixedHeight(120)
-        self.list_files.itemClicked.connect(self.on_file_selected)
+        self.list_files.currentRowChanged.connect(self.on_file_row_changed)
         v_src.addWidget(self.list_files)
+        # 🟢 [新增] 多帧文件的帧选择 (单帧文件隐藏)
+        self.frame_bar = QWidget()
+        h_frame = QHBoxLayout(self.frame_bar)
+        h_frame.setContentsMargins(0, 0, 0, 0)
+        self.sb_frame = QSpinBox()
+        self.sb_frame.valueChanged.connect(self.on_frame_changed)
+        self.lbl_frame_total = QLabel("/ 1")
+        h_frame.addWidget(QLabel("Frame:"))
+        h_frame.addWidget(self.sb_frame, 1)
+        h_frame.addWidget(self.lbl_frame_total)
+        self.chk_avg_frames = QCheckBox("Avg all")
+        self.chk_avg_frames.setToolTip("RUN on row/col profiles averaged over all frames (weak FPN lines)")
+        h_frame.addWidget(self.chk_avg_frames)
+        self.frame_bar.setVisible(False)
+        v_src.addWidget(self.frame_bar)
         l_layout.addWidget(grp_src)
 
         h_batch_btns = QHBoxLayout()
@@ -697,12 +752,25 @@ class LineInspectorApp(QMainWindow):
 
         left_v_splitter.addWidget(self.params_run_container)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["CH", "Type", "Mode", "Idx", "Diff"])
+        # 🟢 [修改] 缺陷表改为模型/视图: 数据直接来自结构化缺陷数组, 排序/过滤在模型内完成
+        table_container = QWidget()
+        v_table = QVBoxLayout(table_container)
+        v_table.setContentsMargins(0, 0, 0, 0)
+        h_filter = QHBoxLayout()
+        h_filter.addWidget(QLabel("Show:"))
+        self.combo_filter = QComboBox()
+        self.combo_filter.addItems(LineDefectTableModel.FILTERS)
+        h_filter.addWidget(self.combo_filter, 1)
+        v_table.addLayout(h_filter)
+        self.table_model = LineDefectTableModel(self)
+        self.combo_filter.currentTextChanged.connect(self.table_model.set_filter)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         self.table.setSortingEnabled(True)  # 启用排序
-        self.table.itemClicked.connect(self.on_table_click)
-        left_v_splitter.addWidget(self.table)
+        self.table.clicked.connect(self.on_table_click)
+        v_table.addWidget(self.table)
+        left_v_splitter.addWidget(table_container)
         left_v_splitter.setSizes([700, 300])
         splitter_h.addWidget(panel_left)
 
@@ -717,6 +785,15 @@ class LineInspectorApp(QMainWindow):
         self.btn_roi.setCheckable(True)
         self.btn_roi.toggled.connect(self.toggle_roi_mode)
         toolbar.addWidget(self.btn_roi)
+        self.btn_live_roi = QPushButton("📈 Live ROI Charts")
+        self.btn_live_roi.setCheckable(True)
+        self.btn_live_roi.toggled.connect(self.toggle_live_roi_charts)
+        toolbar.addWidget(self.btn_live_roi)
+        self.btn_ch_overlay = QPushButton("🌈 Per-Channel Curves")
+        self.btn_ch_overlay.setCheckable(True)
+        self.btn_ch_overlay.setToolTip("在全图曲线上叠加各通道 (4/16/64) 的 Avg / Diff 曲线")
+        self.btn_ch_overlay.toggled.connect(lambda on: self.widget_charts.set_channel_overlay(on))
+        toolbar.addWidget(self.btn_ch_overlay)
         toolbar.addStretch()
         r_layout.addLayout(toolbar)
 
@@ -781,8 +858,13 @@ class LineInspectorApp(QMainWindow):
         h2.addWidget(self.combo_ch)
         self.chk_robust = QCheckBox("Robust (Anti-Interference)");
         self.chk_robust.setChecked(cfg.get("use_robust", True))
+        h3 = QHBoxLayout();
+        h3.addWidget(QLabel("Threads (0=Auto):"));
+        self.sb_workers = self._spin(cfg.get("workers", 0), 256);
+        h3.addWidget(self.sb_workers)
         f_pre.addLayout(h1);
         f_pre.addLayout(h2);
+        f_pre.addLayout(h3);
         f_pre.addWidget(self.chk_robust);
         layout.addWidget(grp_pre)
         grp_th = QGroupBox("3. THRESHOLDS");
@@ -804,6 +886,13 @@ class LineInspectorApp(QMainWindow):
         self.sb_blk = self._spin(cfg.get("block_qty", 10), 100);
         f_th.addWidget(QLabel("Block Qty:"));
         f_th.addWidget(self.sb_blk);
+        self.sb_top_k = self._spin(cfg.get("top_k", 100), 100000);
+        self.sb_top_k.setToolTip("每通道每方向最多保留 Diff 最大的 K 条 (Global / Part 分别计), 0 = 不限")
+        f_th.addWidget(QLabel("Top-K / Ch (0=All):"));
+        f_th.addWidget(self.sb_top_k);
+        for sb in (self.sb_g_h, self.sb_g_v, self.sb_p_h, self.sb_p_v, self.sb_blk, self.sb_top_k):
+            sb.valueChanged.connect(self._invalidate_params)
+            sb.valueChanged.connect(lambda *_: self.refilter_timer.start())  # 不把数值当作间隔传入
         layout.addWidget(grp_th)
         grp_ed = QGroupBox("4. CROP & EDGE");
         f_ed = QVBoxLayout(grp_ed)
@@ -819,6 +908,12 @@ class LineInspectorApp(QMainWindow):
         f_ed.addWidget(QLabel("Edge Gain:"));
         f_ed.addWidget(self.dsb_edge);
         layout.addWidget(grp_ed)
+        # 🟢 [新增] 预处理/裁边参数变化时使参数缓存失效
+        self.combo_bits.currentIndexChanged.connect(self._invalidate_params)
+        self.combo_ch.currentIndexChanged.connect(self._invalidate_params)
+        self.chk_robust.toggled.connect(self._invalidate_params)
+        for sb in (self.sb_workers, self.sb_strip_h, self.sb_strip_v, self.dsb_edge):
+            sb.valueChanged.connect(self._invalidate_params)
         grp_vis = QGroupBox("5. VISUAL");
         f_vis = QVBoxLayout(grp_vis)
         self.sb_vis_pad = self._spin(cfg.get("vis_pad", 5), 100);
@@ -828,17 +923,114 @@ class LineInspectorApp(QMainWindow):
         f_vis.addWidget(QLabel("Crop Pad:"));
         f_vis.addWidget(self.sb_exp_pad);
         layout.addWidget(grp_vis)
+        # 🟢 [新增] RAW 输入格式 (无文件头的传感器数据按此映射; 修改后重新读取当前 .raw)
+        grp_raw = QGroupBox("6. RAW INPUT");
+        f_raw = QVBoxLayout(grp_raw)
+        rf = self.raw_format
+        h_sz = QHBoxLayout();
+        self.sb_raw_w = self._spin(rf['width']);
+        self.sb_raw_h = self._spin(rf['height']);
+        h_sz.addWidget(QLabel("W/H:"));
+        h_sz.addWidget(self.sb_raw_w);
+        h_sz.addWidget(self.sb_raw_h);
+        f_raw.addLayout(h_sz)
+        h_fmt = QHBoxLayout();
+        self.sb_raw_bits = self._spin(rf['bits'], 16);
+        self.sb_raw_bits.setMinimum(8)
+        self.sb_raw_bits.setToolTip("<= 8: 每像素 1 字节; 10~16: 每像素 2 字节 (16-bit 容器)")
+        self.sb_raw_header = self._spin(rf['header'], 2 ** 31 - 1);
+        h_fmt.addWidget(QLabel("Bits:"));
+        h_fmt.addWidget(self.sb_raw_bits);
+        h_fmt.addWidget(QLabel("Header:"));
+        h_fmt.addWidget(self.sb_raw_header);
+        f_raw.addLayout(h_fmt)
+        h_chk = QHBoxLayout();
+        self.chk_raw_be = QCheckBox("Big Endian");
+        self.chk_raw_be.setChecked(rf['big_endian'])
+        self.chk_raw_packed = QCheckBox("MIPI Packed");
+        self.chk_raw_packed.setChecked(rf['packed'])
+        self.chk_raw_packed.setToolTip("MIPI CSI-2 打包 RAW10/12/14 (Bits 填 10/12/14), 检测时逐行解包; 解包值即码值, 不按 Eff. Bits 还原")
+        h_chk.addWidget(self.chk_raw_be);
+        h_chk.addWidget(self.chk_raw_packed);
+        f_raw.addLayout(h_chk)
+        layout.addWidget(grp_raw)
+        self.raw_timer = QTimer()
+        self.raw_timer.setSingleShot(True)
+        self.raw_timer.setInterval(300)
+        self.raw_timer.timeout.connect(self._apply_raw_format)
+        for sb in (self.sb_raw_w, self.sb_raw_h, self.sb_raw_bits, self.sb_raw_header):
+            sb.valueChanged.connect(lambda *_: self.raw_timer.start())  # 保持 300 ms 间隔 (不传入数值)
+        self.chk_raw_be.toggled.connect(lambda *_: self.raw_timer.start())
+        self.chk_raw_packed.toggled.connect(lambda *_: self.raw_timer.start())
 
     def on_viewport_changed(self, visible_rect):
         if self.sync_driver == 'CHART': return
         self.sync_driver = 'IMG';
+        if self.btn_live_roi.isChecked():
+            r = visible_rect.toAlignedRect()
+            self._queue_roi(r.x(), r.y(), r.width(), r.height())
         self.widget_charts.set_axis_zoom(visible_rect);
         self.sync_driver = None
 
+    # 🟢 [修改] 框选后进入实时 ROI 模式: 框选区域立即重检, 之后平移/缩放按可视区域重检
     def on_roi_selected(self, x, y, w, h):
         if self.current_img is None: return
         self.view_main.fitInView(QRectF(x, y, w, h), Qt.AspectRatioMode.KeepAspectRatio)
         self.btn_roi.setChecked(False)
+        self.btn_live_roi.setChecked(True)
+        # fitInView 引起的可视区域信号是节流延后发出的, 先同步发出, 再以框选区域覆盖
+        self.view_main.force_emit_viewport()
+        self._queue_roi(x, y, w, h)
+
+    # 🟢 [新增] 实时 ROI: 开启后图表/缺陷表/叠加线显示当前可视区域 (或框选区域) 的检测结果
+    def toggle_live_roi_charts(self, checked):
+        if self.current_img is None:
+            if checked: self.btn_live_roi.setChecked(False)
+            return
+        if checked:
+            self._queue_viewport_roi()
+        else:
+            self.roi_timer.stop()
+            self.roi_worker.cancel()
+            self.roi_records = None
+            self.restore_full_charts()
+            self.table_model.set_records(self.defect_records)
+            self.draw_defect_visualization()
+
+    def _queue_viewport_roi(self):
+        self.view_main.force_emit_viewport(immediate=False)
+
+    def _queue_roi(self, x, y, w, h):
+        self.roi_rect = (x, y, w, h)
+        self.roi_timer.start()  # 防抖: 连续拖动只在停顿后提交一次
+
+    def _submit_roi_request(self):
+        if self.current_img is None or self.roi_rect is None or not self.btn_live_roi.isChecked(): return
+        self.roi_gen = self.roi_worker.request(self.current_img, self.roi_rect, self._get_current_params())
+
+    def _roi_result_valid(self, gen):
+        return gen == self.roi_gen and self.roi_worker.is_current(gen) and self.btn_live_roi.isChecked()
+
+    def _on_roi_stats(self, gen, payload):
+        if not self._roi_result_valid(gen): return
+        stats, x0, y0 = payload
+        self._set_readout_stats(stats, x0, y0)
+        self.sync_driver = 'IMG'
+        self.widget_charts.update_data(stats['row_avg'], stats['row_diff'], stats['col_avg'], stats['col_diff'],
+                                       y0, x0)
+        self.sync_driver = None
+
+    def _on_roi_result(self, gen, result):
+        if not self._roi_result_valid(gen): return
+        self.roi_records, stats = result
+        x0, y0 = stats['roi'][:2]
+        self._set_readout_stats(stats, x0, y0)
+        self.sync_driver = 'IMG'
+        self.widget_charts.update_data(stats['row_avg'], stats['row_diff'], stats['col_avg'], stats['col_diff'],
+                                       y0, x0, stats['channels'])
+        self.sync_driver = None
+        self.table_model.set_records(self.roi_records)
+        self.draw_defect_visualization()
 
     def on_chart_zoom_req(self, min_val, max_val, orientation):
         if self.sync_driver == 'IMG': return
@@ -865,7 +1057,7 @@ class LineInspectorApp(QMainWindow):
         self.sync_driver = None
 
     def export_excel_report(self):
-        if not self.defects or self.current_img is None:
+        if self.defect_records is None or len(self.defect_records) == 0 or self.current_img is None:
             QMessageBox.warning(self, "Warning", "No defects to export!")
             return
         save_path, _ = QFileDialog.getSaveFileName(self, "Save", "Single_Report.xlsx", "Excel (*.xlsx)")
@@ -875,9 +1067,7 @@ class LineInspectorApp(QMainWindow):
         os.makedirs(temp_dir)
         pad = self.sb_exp_pad.value();
         block_n = self.sb_blk.value()
-        img_src = self.processed_img if self.processed_img is not None else self.current_img
-        h, w = img_src.shape[:2];
-        blk_h, blk_w = h // block_n, w // block_n
+        img_src = self._get_processed_img()
         try:
             workbook = xlsxwriter.Workbook(save_path);
             ws = workbook.add_worksheet("Defect List")
@@ -886,31 +1076,8 @@ class LineInspectorApp(QMainWindow):
             ws.write_row('A1', ["ID", "Channel", "Type", "Mode", "Index", "Diff Value", "Image"], fmt_header)
             ws.set_column('A:F', 10);
             ws.set_column('G:G', 50)
-            for i, d in enumerate(self.defects):
-                idx = d['index'];
-                x0, x1, y0, y1 = 0, w, 0, h
-                if "Part" in d['mode']:
-                    try:
-                        parts = d['mode'].replace("Part(", "").replace(")", "").split(",")
-                        by, bx = int(parts[0]), int(parts[1])
-                        if d['type'] == 'Horizontal':
-                            x0, x1 = bx * blk_w, (bx + 1) * blk_w
-                        else:
-                            y0, y1 = by * blk_h, (by + 1) * blk_h
-                    except:
-                        pass
-
-                crop = None
-                if d['type'] == 'Horizontal':
-                    cy0 = max(0, idx - pad);
-                    cy1 = min(h, idx + pad);
-                    crop = img_src[cy0:cy1, x0:x1]
-                else:
-                    cx0 = max(0, idx - pad);
-                    cx1 = min(w, idx + pad);
-                    crop = img_src[y0:y1, cx0:cx1]
-                    if crop.size > 0: crop = cv2.rotate(crop, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
+            for i, d in enumerate(LineDefectAlgorithm.defect_dicts(self.defect_records)):
+                crop = crop_defect(img_src, d, pad, block_n)
                 if crop.size == 0: continue
                 if crop.dtype == np.uint16:
                     vis_crop = cv2.normalize(crop, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
@@ -938,6 +1105,9 @@ class LineInspectorApp(QMainWindow):
 
     # 🟢 [修改] 3. 关闭时保存到 ini
     def closeEvent(self, event):
+        self.frame_cache.shutdown()
+        self.frame_reader.close()
+        self.roi_worker.stop()
         data = {
             "effective_bits_idx": self.combo_bits.currentIndex(),
             "channel_count_idx": self.combo_ch.currentIndex(),
@@ -947,11 +1117,19 @@ class LineInspectorApp(QMainWindow):
             "thresh_part_h": self.sb_p_h.value(),
             "thresh_part_v": self.sb_p_v.value(),
             "block_qty": self.sb_blk.value(),
+            "top_k": self.sb_top_k.value(),
             "strip_h": self.sb_strip_h.value(),
             "strip_v": self.sb_strip_v.value(),
             "edge_gain": self.dsb_edge.value(),
             "vis_pad": self.sb_vis_pad.value(),
             "crop_pad": self.sb_exp_pad.value(),
+            "workers": self.sb_workers.value(),
+            "raw_width": self.raw_format['width'],
+            "raw_height": self.raw_format['height'],
+            "raw_bits": self.raw_format['bits'],
+            "raw_big_endian": self.raw_format['big_endian'],
+            "raw_header": self.raw_format['header'],
+            "raw_packed": self.raw_format['packed'],
             "last_folder": self.current_folder
         }
         # 调用类内部的保存方法，不再使用 ConfigManager
@@ -966,10 +1144,13 @@ class LineInspectorApp(QMainWindow):
             self.file_list = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if
                               Path(f).suffix.lower() in exts]
             self.file_list.sort()
+            self.list_files.blockSignals(True)
             self.list_files.clear()
             for f in self.file_list: self.list_files.addItem(Path(f).name)
+            if self.file_list: self.list_files.setCurrentRow(0)
+            self.list_files.blockSignals(False)
             self.lbl_info.setText(f"{len(self.file_list)} loaded")
-            if self.file_list: self.list_files.setCurrentRow(0); self.load_image(self.file_list[0])
+            if self.file_list: self.load_image(self.file_list[0])
         except Exception as e:
             print(f"Error loading folder: {e}")
 
@@ -979,70 +1160,147 @@ class LineInspectorApp(QMainWindow):
         if d: self.load_source_folder(d)
 
     def clear_defect_items(self):
-        if hasattr(self, 'defect_items'):
-            for item in self.defect_items:
-                try:
-                    if item.scene() is not None: self.view_main.scene_obj.removeItem(item)
-                except:
-                    pass
-        self.defect_items = []
+        self.view_main.defect_overlay.clear()
 
     def run_analysis(self):
         if self.current_img is None: return
         params = self._get_current_params()
         self.btn_run.setText("RUNNING...")
         QApplication.processEvents()
-        self.processed_img = LineDefectAlgorithm.restore_image(self.current_img, params['effective_bits'])
-        self.defects, stats = LineDefectAlgorithm.run_inspection(self.processed_img, params, is_preprocessed=True)
+        self.processed_img = None
+        self.last_params = params
+        self.result_img = self.current_img
+        self.frame_stack = None
+        if self.chk_avg_frames.isChecked() and self.frame_total > 1:
+            # 🟢 [新增] 多帧平均: 逐帧流式累加投影曲线 (不保存帧), 在平均曲线上检测
+            #    帧尺寸不一致 / 某帧读取失败时提示, 不改动当前结果
+            try:
+                self.frame_stack = ProfileStack(params)
+                with FrameSource(self.current_path, self.raw_format) as frames:
+                    for k, img in enumerate(frames):
+                        if img is None: raise ValueError(f"Cannot read frame {k}")
+                        self.frame_stack.add(img)
+                self.defect_records, stats = self.frame_stack.inspect(params)
+            except Exception as e:
+                self.frame_stack = self.result_img = None
+                self.btn_run.setText("▶ RUN CURRENT IMAGE")
+                QMessageBox.warning(self, "Error", f"Frame averaging failed:\n{e}")
+                return
+        else:
+            self.defect_records, stats = LineDefectAlgorithm.run_inspection(self.current_img, params,
+                                                                            cache=self.diff_cache)
+        self._show_results(stats)
+        self.btn_run.setText("▶ RUN CURRENT IMAGE")
+
+    # 🟢 [新增] 阈值/Block 数变化: 复用缓存的差分曲线重新判定, 实时刷新表格与叠加线
+    def _refilter_defects(self):
+        if self.current_img is None or self.result_img is not self.current_img: return
+        params = self._get_current_params()
+        if self.last_params and self.last_params['effective_bits'] != params['effective_bits']:
+            self.processed_img = None
+        self.last_params = params
+        if self.frame_stack is not None:
+            # 位深/通道数/Block 数变化需重新累加 (RUN), 其余参数直接在平均曲线上重新判定
+            if not self.frame_stack.matches(params): return
+            self.defect_records, stats = self.frame_stack.inspect(params)
+        else:
+            self.defect_records, stats = LineDefectAlgorithm.run_inspection(self.current_img, params,
+                                                                            cache=self.diff_cache)
+        self._show_results(stats)
+
+    def _show_results(self, stats):
         self.last_stats = stats
+        if self.btn_live_roi.isChecked():  # 实时 ROI 模式: 整图结果只保存, 按新参数重检当前 ROI
+            self._queue_viewport_roi()
+            return
+        self._set_readout_stats(stats)
         self.sync_driver = 'IMG'
-        self.widget_charts.update_data(stats['row_avg'], stats['row_diff'], stats['col_avg'], stats['col_diff'], 0, 0)
+        self.widget_charts.update_data(stats['row_avg'], stats['row_diff'], stats['col_avg'], stats['col_diff'], 0, 0,
+                                       stats.get('channels'))
         self.sync_driver = None
 
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(0)
-        for i, d in enumerate(self.defects):
-            row = self.table.rowCount();
-            self.table.insertRow(row)
-
-            it0 = QTableWidgetItem();
-            it0.setData(Qt.ItemDataRole.DisplayRole, d['ch']);
-            it0.setData(Qt.ItemDataRole.UserRole, i);
-            self.table.setItem(row, 0, it0)
-            it1 = QTableWidgetItem(d['type']);
-            it1.setData(Qt.ItemDataRole.UserRole, i);
-            self.table.setItem(row, 1, it1)
-            it2 = QTableWidgetItem(d['mode']);
-            it2.setData(Qt.ItemDataRole.UserRole, i);
-            self.table.setItem(row, 2, it2)
-            it3 = QTableWidgetItem();
-            it3.setData(Qt.ItemDataRole.DisplayRole, d['index']);
-            it3.setData(Qt.ItemDataRole.UserRole, i);
-            self.table.setItem(row, 3, it3)
-            it4 = QTableWidgetItem();
-            it4.setData(Qt.ItemDataRole.DisplayRole, round(d['diff'], 1));
-            it4.setData(Qt.ItemDataRole.UserRole, i);
-            self.table.setItem(row, 4, it4)
-
-        self.table.setSortingEnabled(True)
+        self.table_model.set_records(self.defect_records)
         self.draw_defect_visualization()
-        self.btn_run.setText("▶ RUN CURRENT IMAGE")
 
-    def load_image(self, path):
-        self.current_img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
-        if self.current_img is None: return
+    # 🟢 [新增] 按上次检测参数按需生成还原图 (导出截图时才需要)
+    def _get_processed_img(self):
+        if self.processed_img is None and self.current_img is not None:
+            self.processed_img = self._restore_current(self.last_params or self._get_current_params())
+        return self.processed_img
+
+    # 🟢 [新增] 还原当前图像: 需要查表时写入复用缓冲区, 避免每次分配整帧内存
+    def _restore_current(self, params):
+        bits = params['effective_bits']
+        out = None
+        if get_restore_lut(bits) is not None and self.current_img.ndim == 2:
+            if self._restore_buf is None or self._restore_buf.shape != self.current_img.shape:
+                self._restore_buf = np.empty(self.current_img.shape, dtype=np.uint16)
+            out = self._restore_buf
+        return LineDefectAlgorithm.restore_image(self.current_img, bits, out=out, workers=resolve_workers(params))
+
+    # 🟢 [新增] RAW 格式变化: 已缓存的帧按旧格式映射, 清空后重新读取当前 .raw
+    def _apply_raw_format(self):
+        self.raw_format = {'width': self.sb_raw_w.value(), 'height': self.sb_raw_h.value(),
+                           'bits': self.sb_raw_bits.value(), 'big_endian': self.chk_raw_be.isChecked(),
+                           'header': self.sb_raw_header.value(), 'packed': self.chk_raw_packed.isChecked()}
+        self.frame_reader.close()
+        self.frame_reader = FrameReader(self.raw_format)
+        self.frame_cache.clear()
+        if self.current_path and Path(self.current_path).suffix.lower() == '.raw':
+            self._set_frame_total(frame_count(self.current_path, self.raw_format))
+            self.load_image(self.current_path, min(self.current_frame, max(0, self.frame_total - 1)))
+
+    def _set_frame_total(self, n):
+        self.frame_total = max(n, 1)
+        self.sb_frame.blockSignals(True)
+        self.sb_frame.setRange(0, self.frame_total - 1)
+        self.sb_frame.blockSignals(False)
+        self.lbl_frame_total.setText(f"/ {self.frame_total}")
+        self.frame_bar.setVisible(self.frame_total > 1)
+
+    def on_frame_changed(self, k):
+        if self.current_path: self.load_image(self.current_path, k)
+
+    def load_image(self, path, frame=0):
+        # 🟢 [修改] 原图与 8-bit 预览来自浏览缓存 (已预取时无需等待解码/归一化); 多帧文件按帧号读取
+        if path != self.current_path:
+            self._set_frame_total(frame_count(path, self.raw_format))
+        self.current_path, self.current_frame = path, frame
+        self.sb_frame.blockSignals(True)
+        self.sb_frame.setValue(frame)
+        self.sb_frame.blockSignals(False)
+        entry = self.frame_cache.get((path, frame))
+        if entry is None:
+            hint = " (set RAW W/H)" if Path(path).suffix.lower() == '.raw' else ""
+            self.lbl_info.setText(f"{Path(path).name}\nCannot read{hint}")
+            return
+        self.current_img, vis = entry
         h, w = self.current_img.shape[:2]
-        self.lbl_info.setText(f"{Path(path).name}\n{w}x{h} | {self.current_img.dtype}")
-        if self.current_img.dtype == np.uint16:
-            vis = cv2.normalize(self.current_img, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-        else:
-            vis = self.current_img.astype(np.uint8)
+        tag = f" | #{frame}/{self.frame_total}" if self.frame_total > 1 else ""
+        self.lbl_info.setText(f"{Path(path).name}\n{w}x{h} | {self.current_img.dtype}{tag}")
         self.view_main.set_image(vis)
+        self._prefetch_neighbors(path, frame)
         self.clear_defect_items()
         self.processed_img = None;
         self.last_stats = None
-        self.lbl_cursor_rdiff.setText("H-Diff: -");
-        self.lbl_cursor_cdiff.setText("V-Diff: -")
+        self.result_img = None
+        self.frame_stack = None
+        self.roi_worker.cancel()
+        self.roi_records = None
+        if self.btn_live_roi.isChecked(): self._queue_viewport_roi()
+        self._set_readout_stats(None)
+
+    # 🟢 [新增] 后台预取前后 prefetch_radius 张 (先下一张, 再上一张, 依次向外); 多帧文件预取前后帧
+    def _prefetch_neighbors(self, path, frame=0):
+        order = []
+        if self.frame_total > 1:
+            for k in range(1, self.prefetch_radius + 1):
+                order += [(path, j) for j in (frame + k, frame - k) if 0 <= j < self.frame_total]
+        elif path in self.file_list:
+            i = self.file_list.index(path)
+            for k in range(1, self.prefetch_radius + 1):
+                order += [(self.file_list[j], 0) for j in (i + k, i - k) if 0 <= j < len(self.file_list)]
+        self.frame_cache.prefetch(order)
 
     def open_batch_snap_dialog(self):
         if self.file_list:
@@ -1061,92 +1319,114 @@ class LineInspectorApp(QMainWindow):
         self.params_run_container.setVisible(not v);
         self.btn_toggle_params.setText("▲ Show" if v else "▼ Hide")
 
-    def on_file_selected(self, item):
-        for f in self.file_list:
-            if Path(f).name == item.text(): self.load_image(f); break
+    # 🟢 [修改] 点击或方向键切换都会触发 (列表与 file_list 顺序一致)
+    def on_file_row_changed(self, row):
+        if 0 <= row < len(self.file_list): self.load_image(self.file_list[row], 0)
 
     def toggle_roi_mode(self, checked):
         if self.current_img is None: self.btn_roi.setChecked(False); return
         self.view_main.set_roi_mode(checked)
 
     def restore_full_charts(self):
+        self._set_readout_stats(self.last_stats)
         if self.last_stats:
             self.sync_driver = 'IMG'
             self.widget_charts.update_data(self.last_stats['row_avg'], self.last_stats['row_diff'],
-                                           self.last_stats['col_avg'], self.last_stats['col_diff'], 0, 0)
+                                           self.last_stats['col_avg'], self.last_stats['col_diff'], 0, 0,
+                                           self.last_stats.get('channels'))
             self.sync_driver = None
 
     def _spin(self, v, m=65535):
         s = QSpinBox(); s.setRange(0, m); s.setValue(int(v)); return s
 
-    def _get_current_params(self):
-        b = 16;
-        t = self.combo_bits.currentText();
-        if '10' in t:
-            b = 10
-        elif '12' in t:
-            b = 12
-        elif '14' in t:
-            b = 14
-        c = 4;
-        t = self.combo_ch.currentText();
-        if '16' in t:
-            c = 16
-        elif '64' in t:
-            c = 64
-        return {'effective_bits': b, 'channel_count': c, 'edge_gain': self.dsb_edge.value(),
-                'thresh_global_h': self.sb_g_h.value(), 'thresh_global_v': self.sb_g_v.value(),
-                'thresh_part_h': self.sb_p_h.value(), 'thresh_part_v': self.sb_p_v.value(),
-                'block_qty': self.sb_blk.value(), 'strip_h': self.sb_strip_h.value(),
-                'strip_v': self.sb_strip_v.value(),
-                'use_robust': 1 if self.chk_robust.isChecked() else 0}
+    # 🟢 [修改] 参数只在控件变化后解析一次 (下拉框按索引取值, 与 batch_inspector 共用选项表)
+    def _invalidate_params(self):
+        self._params = None
+        self._schedule_readout()  # 位深变化时还原值随之变化
 
+    def _get_current_params(self):
+        if self._params is None:
+            self._params = {'effective_bits': BITS_OPTIONS[self.combo_bits.currentIndex()],
+                            'channel_count': CHANNEL_OPTIONS[self.combo_ch.currentIndex()],
+                            'edge_gain': self.dsb_edge.value(),
+                            'thresh_global_h': self.sb_g_h.value(), 'thresh_global_v': self.sb_g_v.value(),
+                            'thresh_part_h': self.sb_p_h.value(), 'thresh_part_v': self.sb_p_v.value(),
+                            'block_qty': self.sb_blk.value(), 'top_k': self.sb_top_k.value(),
+                            'strip_h': self.sb_strip_h.value(), 'strip_v': self.sb_strip_v.value(),
+                            'workers': self.sb_workers.value(),
+                            'use_robust': 1 if self.chk_robust.isChecked() else 0}
+            self._restore_lut = get_restore_lut(self._params['effective_bits'])
+        return dict(self._params)  # 副本: 调用方 (后台线程/弹窗) 持有的参数不受之后修改影响
+
+    # 🟢 [修改] 鼠标移动只记录位置; 读数在定时器中按最新位置刷新 (快速移动时每帧最多一次)
     def on_mouse_moved(self, x, y):
         if self.current_img is None: return
+        self.cursor_pos = (x, y)
+        self._schedule_readout()
+
+    def _schedule_readout(self):
+        if not self.cursor_timer.isActive(): self.cursor_timer.start()
+
+    def _set_readout_stats(self, stats, x0=0, y0=0):
+        """设置光标读数所用的曲线 (整图或当前 ROI, 曲线第 0 点对应原图 x0/y0); 预先建好像素相位 -> 通道号表"""
+        ch_at = None
+        channels = stats.get('channels') if stats else None
+        if channels is not None:
+            step = channels['step']
+            phase = (channels['offsets'] - (y0, x0)) % step
+            ch_at = np.full((step, step), -1, dtype=np.int64)
+            ch_at[phase[:, 0], phase[:, 1]] = np.arange(len(phase))
+        self.readout = None if stats is None else (stats, x0, y0, ch_at)
+        self._schedule_readout()
+
+    @staticmethod
+    def _set_label(label, text):
+        if label.text() != text: label.setText(text)
+
+    def _update_cursor_readout(self):
+        if self.current_img is None or self.cursor_pos is None: return
+        x, y = self.cursor_pos
         h, w = self.current_img.shape[:2]
+        if not (0 <= x < w and 0 <= y < h):
+            self._set_label(self.lbl_cursor_pos, "XY: - , -")
+            return
 
-        if 0 <= x < w and 0 <= y < h:
-            # 1. 获取原始像素值
-            raw_val = self.current_img[y, x]
-
-            # 2. 获取目标位深 (10/12/14/16)
-            target_bits = 16
-            txt = self.combo_bits.currentText()
-            if '10' in txt:
-                target_bits = 10
-            elif '12' in txt:
-                target_bits = 12
-            elif '14' in txt:
-                target_bits = 14
-
-            # 3. 换算数值 (仅针对 16-bit 图)
-            # 假设图像数据是高位对齐 (MSB Aligned) 存储在 16-bit 中的
-            # 例如 10-bit 数据: 0-1023 映射到 0-65535，需要右移 6 位还原
-            disp_val = raw_val
-            if self.current_img.dtype == np.uint16:
-                shift = max(0, 16 - target_bits)
-                disp_val = raw_val >> shift
-
-            # 4. 更新显示
-            self.lbl_cursor_pos.setText(f"XY: {x}, {y}")
-            self.lbl_cursor_val.setText(f"Val: {disp_val}")
-
-            # 更新差分值显示
-            if self.last_stats:
-                try:
-                    self.lbl_cursor_rdiff.setText(f"H:{self.last_stats['row_diff'][y]:.1f}")
-                    self.lbl_cursor_cdiff.setText(f"V:{self.last_stats['col_diff'][x]:.1f}")
-                except:
-                    pass
+        # 1. 原始值 + 还原值 (与检测相同的查表还原; 16-bit / 8-bit 无需还原)
+        if self._params is None: self._get_current_params()
+        raw_val = self.current_img[y, x]
+        self._set_label(self.lbl_cursor_pos, f"XY: {x}, {y}")
+        dt = self.current_img.dtype  # 大端 raw 为 '>u2', 取出的标量已是数值, 直接查表; 打包帧解包值无需还原
+        if self._restore_lut is not None and dt.kind == 'u' and dt.itemsize == 2 \
+                and not isinstance(self.current_img, MipiPackedFrame):
+            self._set_label(self.lbl_cursor_val, f"Val: {self._restore_lut[raw_val]} (raw {raw_val})")
         else:
-            self.lbl_cursor_pos.setText("XY: - , -")
-
-    def on_table_click(self, item):
-        original_idx = item.data(Qt.ItemDataRole.UserRole)
-        if original_idx is not None and 0 <= original_idx < len(self.defects):
-            d = self.defects[original_idx];
-            idx = d['index']
-            if d['type'] == 'Horizontal':
+            self._set_label(self.lbl_cursor_val, f"Val: {raw_val}")
+
+        # 2. 差分: 包络值 + 光标像素所属通道的差分 (直接索引缓存的曲线矩阵)
+        r_txt, c_txt = "H-Diff: -", "V-Diff: -"
+        if self.readout is not None:
+            stats, x0, y0, ch_at = self.readout
+            iy, ix = y - y0, x - x0
+            in_rows, in_cols = 0 <= iy < len(stats['row_diff']), 0 <= ix < len(stats['col_diff'])
+            if in_rows: r_txt = f"H:{stats['row_diff'][iy]:.1f}"
+            if in_cols: c_txt = f"V:{stats['col_diff'][ix]:.1f}"
+            if ch_at is not None and in_rows and in_cols:
+                ch = stats['channels']
+                step = ch['step']
+                c = ch_at[iy % step, ix % step]
+                if c >= 0 and iy // step < ch['rows'][c]:
+                    r_txt += f" (CH{c}: {ch['row_diff'][c, iy // step]:.1f})"
+                if c >= 0 and ix // step < ch['cols'][c]:
+                    c_txt += f" (CH{c}: {ch['col_diff'][c, ix // step]:.1f})"
+        self._set_label(self.lbl_cursor_rdiff, r_txt)
+        self._set_label(self.lbl_cursor_cdiff, c_txt)
+
+    def on_table_click(self, index):
+        original_idx = self.table_model.record_index(index.row())
+        if original_idx is not None:
+            r = self.table_model.records()[original_idx];
+            idx = int(r['index'])
+            if r['type'] == DEFECT_H:
                 self.view_main.centerOn(0, idx)
             else:
                 self.view_main.centerOn(idx, 0)
@@ -1158,19 +1438,18 @@ class LineInspectorApp(QMainWindow):
             self.view_main.centerOn(i, 0); self.view_main.highlight_defect(i, self.view_main.sceneRect().center().y())
 
     def draw_defect_visualization(self):
-        self.clear_defect_items()
+        # 🟢 [修改] 所有缺陷线由一个叠加图元绘制 (几何数据整体替换, 不再逐条 addRect/removeItem)
         pad = self.sb_vis_pad.value();
         h, w = self.current_img.shape[:2]
-        for d in self.defects:
-            idx = d['index'];
-            p = QPen(QColor("#ff1744") if d['type'] == 'Horizontal' else QColor("#2979ff"), 2);
-            p.setCosmetic(True)
-            if d['type'] == 'Horizontal':
-                y0 = max(0, idx - pad); self.defect_items.append(
-                    self.view_main.scene_obj.addRect(0, y0, w, min(h, idx + pad) - y0, p))
-            else:
-                x0 = max(0, idx - pad); self.defect_items.append(
-                    self.view_main.scene_obj.addRect(x0, 0, min(w, idx + pad) - x0, h, p))
+        rec = self.roi_records if self.btn_live_roi.isChecked() else self.defect_records
+        if rec is None or len(rec) == 0:
+            self.clear_defect_items()
+            return
+        idx = rec['index'].astype(np.int64)
+        lo, hi = np.maximum(0, idx - pad), np.minimum(np.where(rec['type'] == DEFECT_H, h, w), idx + pad)
+        is_h = rec['type'] == DEFECT_H
+        self.view_main.defect_overlay.set_bands(w, h, np.stack([lo[is_h], hi[is_h]], 1),
+                                                np.stack([lo[~is_h], hi[~is_h]], 1))
 
     def apply_theme(self):
         self.setStyleSheet("""
@@ -1181,8 +1460,8 @@ class LineInspectorApp(QMainWindow):
             QLineEdit, QSpinBox, QComboBox { background-color: #0f0f0f; border: 1px solid #333; padding: 5px; color: #00e676; font-family: 'Consolas'; border-radius: 3px; }
             QGroupBox { border: 1px solid #333; margin-top: 20px; font-weight: bold; color: #888; border-radius: 4px; }
             QGroupBox::title { subcontrol-origin: margin; left: 10px; padding: 0 5px; background-color: #121212; color: #00e676; }
-            QListWidget, QTableWidget { background-color: #0a0a0a; border: 1px solid #333; outline: none; }
-            QListWidget::item:selected, QTableWidget::item:selected { background-color: rgba(0, 230, 118, 0.2); border: 1px solid #00e676; color: #fff; }
+            QListWidget, QTableView { background-color: #0a0a0a; border: 1px solid #333; outline: none; }
+            QListWidget::item:selected, QTableView::item:selected { background-color: rgba(0, 230, 118, 0.2); border: 1px solid #00e676; color: #fff; }
             QHeaderView::section { background-color: #1a1a1a; color: #888; padding: 6px; border: none; border-bottom: 2px solid #333; }
             QTableCornerButton::section { background-color: #1a1a1a; border: 1px solid #333; }
             QHeaderView { background-color: #1a1a1a; }
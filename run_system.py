@@ -117,6 +117,11 @@ class IntegratedSystem(QMainWindow):
 if __name__ == "__main__":
     multiprocessing.freeze_support()
 
+    # 🟢 无界面批量检测 (夜间整批跑图): run_system.py --batch <folder> [-o 输出目录] [-j 进程数]
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        from core.batch_inspector import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+
     if hasattr(Qt.ApplicationAttribute, 'AA_EnableHighDpiScaling'):
         QApplication.setAttribute(Qt.ApplicationAttribute.AA_EnableHighDpiScaling, True)
     if hasattr(Qt.ApplicationAttribute, 'AA_UseHighDpiPixmaps'):
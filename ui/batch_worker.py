@@ -0,0 +1,110 @@
+import queue
+import threading
+from PyQt6.QtCore import QThread, pyqtSignal
+
+
+# ==============================================================================
+# 🟢 批量流水线: 解码 -> 处理 -> 导出 三级并行 (有界队列衔接, I/O 与计算重叠)
+#    解码/导出各一个后台线程, 处理阶段在 QThread 本身执行; cv2 读写与 Numba 内核均释放 GIL
+# ==============================================================================
+class BatchPipeline(QThread):
+    sig_progress = pyqtSignal(int, int, str)  # 已导出数量, 总数, 文件名
+    sig_finished = pyqtSignal(str, bool)  # finish() 返回值 (报告路径), 是否被取消
+    sig_error = pyqtSignal(str)
+
+    def __init__(self, paths, decode, process, export, finish=None, queue_size=2, parent=None):
+        """
+        decode(path) -> data (None 表示读取失败, 跳过)
+        process(path, data) -> result   (计算阶段)
+        export(index, path, result)     (写文件/报告, 只在导出线程调用, 报告对象无需加锁)
+        finish() -> str                 (全部导出后在流水线线程调用, 取消时也会调用以保存已完成部分)
+        """
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.decode, self.process, self.export, self.finish = decode, process, export, finish
+        self.q_decoded = queue.Queue(maxsize=queue_size)
+        self.q_processed = queue.Queue(maxsize=queue_size)
+        self._cancelled = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._error = None
+
+    # --- 控制 (GUI 线程调用) ---
+    def cancel(self):
+        self._cancelled.set()
+        self._resume.set()  # 暂停中也要能退出
+
+    def set_paused(self, paused):
+        if paused and not self._cancelled.is_set():
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    def is_paused(self):
+        return not self._resume.is_set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    # --- 各阶段: 取消后继续排空上游队列直到结束标记, 保证有界队列不会卡死 ---
+    def _fail(self, e):
+        if self._error is None: self._error = f"{type(e).__name__}: {e}"
+        self.cancel()
+
+    def _decode_loop(self):
+        try:
+            for i, p in enumerate(self.paths):
+                self._resume.wait()
+                if self._cancelled.is_set(): break
+                self.q_decoded.put((i, p, self.decode(p)))
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.q_decoded.put(None)
+
+    def _export_loop(self):
+        done = 0
+        while True:
+            item = self.q_processed.get()
+            if item is None: break
+            if self._cancelled.is_set(): continue
+            i, p, result = item
+            try:
+                if result is not None: self.export(i, p, result)
+            except Exception as e:
+                self._fail(e)
+                continue
+            done += 1
+            self.sig_progress.emit(done, len(self.paths), p)
+
+    def run(self):
+        t_decode = threading.Thread(target=self._decode_loop, daemon=True)
+        t_export = threading.Thread(target=self._export_loop, daemon=True)
+        t_decode.start()
+        t_export.start()
+        try:
+            while True:
+                item = self.q_decoded.get()
+                if item is None: break
+                if self._cancelled.is_set(): continue
+                self._resume.wait()
+                i, p, data = item
+                try:
+                    result = None if data is None else self.process(p, data)
+                except Exception as e:
+                    self._fail(e)
+                    continue
+                self.q_processed.put((i, p, result))
+        finally:
+            self.q_processed.put(None)
+            t_decode.join()
+            t_export.join()
+
+        out = ""
+        try:
+            if self.finish: out = self.finish() or ""
+        except Exception as e:
+            self._fail(e)
+        if self._error:
+            self.sig_error.emit(self._error)
+        self.sig_finished.emit(out, self._cancelled.is_set())
@@ -4,9 +4,11 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QDialog,
     QLabel, QPushButton, QFrame
 )
-from PyQt6.QtCore import pyqtSignal, Qt
+from PyQt6.QtCore import pyqtSignal, Qt, QAbstractTableModel, QModelIndex
 from PyQt6.QtGui import QColor, QPen
 
+from core.line_algorithm import DEFECT_DTYPE, DEFECT_TYPES, DEFECT_H
+
 
 # ==============================================================================
 # 1. 可拆卸图表包装器 (保持不变)
@@ -91,6 +93,7 @@ class LineProfileWidget(QWidget):
         self.vb_row_diff = None
         self.vb_col_diff = None
         self.is_external_updating = False
+        self.show_channels = False
 
         # 🟢 创建图表时，接收返回的 line 对象
         # Row Chart (Y-Axis Analysis)
@@ -117,8 +120,7 @@ class LineProfileWidget(QWidget):
         p.showGrid(x=True, y=True, alpha=0.3)
         p.getPlotItem().hideButtons()
 
-        p.setClipToView(True)
-        p.setDownsampling(mode='peak')
+        # 抽稀由 MinMaxPyramid 完成 (每次只给 pyqtgraph 屏幕分辨率的一段), 不再让 pyqtgraph 逐次重算
         p.setMenuEnabled(False)
 
         # Left Axis
@@ -126,8 +128,12 @@ class LineProfileWidget(QWidget):
         p.getPlotItem().getAxis('left').setPen(color1)
 
         curve1 = pg.PlotDataItem(pen=QPen(QColor(color1), 1), name=name1)
-        curve1.setDownsampling(auto=True, method='peak')
         p.addItem(curve1)
+        # 🟢 [新增] 分通道叠加: 所有通道拼成一条路径 (NaN 断开), 一个图元绘制
+        ch_avg = pg.PlotDataItem(pen=pg.mkPen(QColor(color1).lighter(150), width=1), connect='finite')
+        ch_avg.setOpacity(0.45)
+        ch_avg.setVisible(False)
+        p.addItem(ch_avg)
 
         # Right Axis
         vb2 = pg.ViewBox()
@@ -139,8 +145,11 @@ class LineProfileWidget(QWidget):
         vb2.setXLink(p.getPlotItem())
 
         curve2 = pg.PlotDataItem(pen=QPen(QColor(color2), 1), name=name2)
-        curve2.setDownsampling(auto=True, method='peak')
         vb2.addItem(curve2)
+        ch_diff = pg.PlotDataItem(pen=pg.mkPen(QColor(color2).lighter(150), width=1), connect='finite')
+        ch_diff.setOpacity(0.45)
+        ch_diff.setVisible(False)
+        vb2.addItem(ch_diff)
 
         # 🟢 [新增] 中心指示线 (黄色虚线)
         v_line = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('#FFFF00', width=1, style=Qt.PenStyle.DashLine))
@@ -156,7 +165,14 @@ class LineProfileWidget(QWidget):
 
         p.curve_avg = curve1
         p.curve_diff = curve2
+        p.curve_ch_avg = ch_avg
+        p.curve_ch_diff = ch_diff
         p.vb_diff = vb2
+        p.pyramids = {}  # curve -> MinMaxPyramid (分通道叠加为多曲线金字塔)
+
+        # 🟢 [新增] X 范围 / 尺寸变化时, 从金字塔取当前范围的屏幕分辨率切片 (平移/同步缩放时常数时间)
+        p.getPlotItem().vb.sigXRangeChanged.connect(lambda *_: self._refresh_curves(p))
+        p.getPlotItem().vb.sigResized.connect(lambda *_: self._refresh_curves(p))
 
         # 返回 line 对象以便后续控制
         return p, vb2, v_line
@@ -166,34 +182,65 @@ class LineProfileWidget(QWidget):
         (x_min, x_max) = plot_widget.viewRange()[0]
         self.sig_zoom_req.emit(x_min, x_max, orientation)
 
-    def update_data(self, row_avg, row_diff, col_avg, col_diff, start_y=0, start_x=0):
+    def update_data(self, row_avg, row_diff, col_avg, col_diff, start_y=0, start_x=0, channels=None):
+        """channels: run_inspection 的 stats['channels'] (各通道曲线); None 时不显示分通道叠加"""
         self.is_external_updating = True
         self.plot_row.blockSignals(True)
         self.plot_col.blockSignals(True)
 
-        r_avg = np.array(row_avg);
-        r_diff = np.array(row_diff)
-        c_avg = np.array(col_avg);
-        c_diff = np.array(col_diff)
-
-        y_axis = np.arange(start_y, start_y + len(r_avg))
-        self.plot_row.curve_avg.setData(x=y_axis, y=r_avg)
-        self.plot_row.curve_diff.setData(x=y_axis, y=r_diff)
+        # 🟢 [修改] 每条曲线建一次 Min/Max 金字塔, 先以全范围包络显示并自动缩放
+        for p, avg, diff, start in ((self.plot_row, row_avg, row_diff, start_y),
+                                    (self.plot_col, col_avg, col_diff, start_x)):
+            p.pyramids = {p.curve_avg: MinMaxPyramid(avg, start), p.curve_diff: MinMaxPyramid(diff, start)}
+        self._set_channel_pyramids(channels)
+        for p in (self.plot_row, self.plot_col):
+            self._refresh_curves(p, full=True)
 
-        x_axis = np.arange(start_x, start_x + len(c_avg))
-        self.plot_col.curve_avg.setData(x=x_axis, y=c_avg)
-        self.plot_col.curve_diff.setData(x=x_axis, y=c_diff)
-
-        # Reset
-        self.plot_row.getPlotItem().vb.autoRange()
-        self.plot_col.getPlotItem().vb.autoRange()
-        self.vb_row_diff.autoRange()
-        self.vb_col_diff.autoRange()
+        # Reset (Y 轴按全曲线范围定好后固定, 平移时不随切片跳动)
+        for vb in (self.plot_row.getPlotItem().vb, self.plot_col.getPlotItem().vb, self.vb_row_diff, self.vb_col_diff):
+            vb.autoRange()
+            vb.disableAutoRange()
 
         self.plot_row.blockSignals(False)
         self.plot_col.blockSignals(False)
         self.is_external_updating = False
 
+    def _set_channel_pyramids(self, channels):
+        for p, axis in ((self.plot_row, 'row'), (self.plot_col, 'col')):
+            for curve in (p.curve_ch_avg, p.curve_ch_diff):
+                p.pyramids.pop(curve, None)
+                curve.setData(x=[], y=[])
+            if channels is None: continue
+            step = channels['step']
+            lens = channels['rows' if axis == 'row' else 'cols']
+            offs = channels['offsets'][:, 0 if axis == 'row' else 1]
+            for curve, mat in ((p.curve_ch_avg, channels[axis + '_avg']), (p.curve_ch_diff, channels[axis + '_diff'])):
+                p.pyramids[curve] = MinMaxPyramid(mat, offs, step, lens)
+        self._apply_channel_visibility()
+
+    def set_channel_overlay(self, enabled):
+        """分通道曲线叠加开关 (4/16/64 通道曲线半透明叠加在包络上)"""
+        self.show_channels = enabled
+        self._apply_channel_visibility()
+        for p in (self.plot_row, self.plot_col):
+            self._refresh_curves(p)
+
+    def _apply_channel_visibility(self):
+        for p in (self.plot_row, self.plot_col):
+            visible = self.show_channels and p.curve_ch_avg in p.pyramids
+            p.curve_ch_avg.setVisible(visible)
+            p.curve_ch_diff.setVisible(visible)
+
+    def _refresh_curves(self, plot_widget, full=False):
+        if not plot_widget.pyramids: return
+        vb = plot_widget.getPlotItem().vb
+        x_min, x_max = (None, None) if full else vb.viewRange()[0]
+        n_px = max(64, int(vb.width()))
+        for curve, pyr in plot_widget.pyramids.items():
+            if pyr.multi and not curve.isVisible(): continue
+            xs, ys = pyr.slice(x_min, x_max, n_px)
+            curve.setData(x=xs, y=ys, connect='finite' if pyr.multi else 'all')
+
     def set_axis_zoom(self, rect_f):
         """ 极致性能的视图同步 + 中心线更新 """
         self.is_external_updating = True
@@ -225,4 +272,171 @@ class LineProfileWidget(QWidget):
                 if plot_widget == self.plot_row:
                     self.sig_curve_clicked.emit('H', index)
                 else:
-                    self.sig_curve_clicked.emit('V', index)
\ No newline at end of file
+                    self.sig_curve_clicked.emit('V', index)
+
+
+# ==============================================================================
+# 3. 缺陷表格模型 (虚拟化: 直接读结构化缺陷数组, 只为可见行生成显示数据)
+# ==============================================================================
+class LineDefectTableModel(QAbstractTableModel):
+    HEADERS = ["CH", "Type", "Mode", "Idx", "Diff"]
+    FILTERS = ["All", "Horizontal", "Vertical", "Global", "Part"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rec = np.empty(0, dtype=DEFECT_DTYPE)
+        self._rows = np.empty(0, dtype=np.int64)  # 显示行 -> 记录下标 (排序 + 过滤后的排列)
+        self._sort_col = -1
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._filter = "All"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        ri = int(self._rows[index.row()])
+        if role == Qt.ItemDataRole.DisplayRole:
+            r = self._rec[ri]
+            col = index.column()
+            if col == 0: return int(r['ch'])
+            if col == 1: return DEFECT_TYPES[r['type']]
+            if col == 2: return 'Global' if r['is_global'] else f"Part({r['block_y']},{r['block_x']})"
+            if col == 3: return int(r['index'])
+            if col == 4: return round(float(r['diff']), 1)
+        elif role == Qt.ItemDataRole.UserRole:
+            return ri
+        elif role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def records(self):
+        return self._rec
+
+    def record_index(self, row):
+        return int(self._rows[row]) if 0 <= row < len(self._rows) else None
+
+    def set_records(self, records):
+        """检测结果整体替换 (保留当前排序与过滤条件)"""
+        self.beginResetModel()
+        self._rec = records if records is not None else np.empty(0, dtype=DEFECT_DTYPE)
+        self._rows = self._arrange()
+        self.endResetModel()
+
+    def set_filter(self, name):
+        self.beginResetModel()
+        self._filter = name
+        self._rows = self._arrange()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self._sort_col, self._sort_order = column, order
+        self._rows = self._arrange()
+        self.layoutChanged.emit()
+
+    def _arrange(self):
+        rec = self._rec
+        rows = np.arange(len(rec))
+        f = self._filter
+        if f == "Horizontal":
+            rows = rows[rec['type'] == DEFECT_H]
+        elif f == "Vertical":
+            rows = rows[rec['type'] != DEFECT_H]
+        elif f == "Global":
+            rows = rows[rec['is_global']]
+        elif f == "Part":
+            rows = rows[~rec['is_global']]
+
+        col = self._sort_col
+        if 0 <= col < len(self.HEADERS) and len(rows) > 1:
+            sub = rec[rows]
+            if col == 2:  # Mode: Global 在前, 再按 Block 坐标
+                order = np.lexsort((sub['block_x'], sub['block_y'], ~sub['is_global']))
+            else:
+                order = np.argsort(sub[('ch', 'type', None, 'index', 'diff')[col]], kind='stable')
+            if self._sort_order == Qt.SortOrder.DescendingOrder:
+                order = order[::-1]
+            rows = rows[order]
+        return rows
+
+
+# ==============================================================================
+# 4. Min/Max 抽稀金字塔 (第 k 级每桶覆盖 2^k 个点, 保存桶内最小/最大值, 单点尖峰不会丢失)
+#    可一次处理多条曲线 (通道 × 长度), 切片结果用 NaN 断开拼成一条路径
+# ==============================================================================
+class MinMaxPyramid:
+    def __init__(self, y, start=0, step=1, lengths=None):
+        """
+        y: 一维曲线, 或 (曲线数, 长度) 矩阵 (各曲线有效长度 lengths, 之后为补齐部分)
+        第 c 条曲线第 i 点的横坐标为 start[c] + i * step (分通道曲线 step = 通道步长)
+        """
+        y = np.asarray(y, dtype=np.float32)
+        self.multi = y.ndim == 2
+        self.step = step
+        if y.size == 0:  # 空曲线 (ROI 过小 / 通道为空): 空金字塔, slice() 返回空数组
+            self.n = 0
+            self.start = np.zeros(0)
+            self.lengths = np.zeros(0, dtype=np.int64)
+            self.y = np.zeros((0, 0), dtype=np.float32)
+            self.levels = [(self.y, self.y)]
+            return
+        y = y.reshape(-1, y.shape[-1])
+        n_curves, self.n = y.shape
+        self.start = np.broadcast_to(np.asarray(start, dtype=np.float64), (n_curves,))
+        self.lengths = np.full(n_curves, self.n) if lengths is None else np.asarray(lengths)
+
+        # 补齐部分用各曲线最后一个有效值填充 (不改变极值)
+        if n_curves and np.any(self.lengths < self.n):
+            y = y.copy()
+            for c in np.flatnonzero(self.lengths < self.n):
+                y[c, self.lengths[c]:] = y[c, self.lengths[c] - 1] if self.lengths[c] else np.nan
+        self.y = y
+        self.levels = [(y, y)]
+        lo = hi = y
+        while lo.shape[1] > 1:
+            if lo.shape[1] % 2:  # 奇数长度: 末尾补最后一列, 不影响极值
+                lo, hi = np.concatenate([lo, lo[:, -1:]], 1), np.concatenate([hi, hi[:, -1:]], 1)
+            lo = np.minimum(lo[:, 0::2], lo[:, 1::2])
+            hi = np.maximum(hi[:, 0::2], hi[:, 1::2])
+            self.levels.append((lo, hi))
+
+    def slice(self, x_min=None, x_max=None, n_px=1000):
+        """返回 [x_min, x_max] 范围内每条曲线不超过约 2*n_px 个点的 (x, y); 非原始级别按 (min, max) 交替输出"""
+        if self.n == 0 or len(self.start) == 0:
+            return np.zeros(0), np.zeros(0, dtype=np.float32)
+        st = self.step
+        s_lo, s_hi = self.start.min(), self.start.max()
+        i0 = 0 if x_min is None else int(np.clip(np.floor((x_min - s_hi) / st), 0, self.n - 1))
+        i1 = self.n if x_max is None else int(np.clip(np.ceil((x_max - s_lo) / st) + 1, i0 + 1, self.n))
+        k = 0
+        while (i1 - i0) >> k > n_px and k + 1 < len(self.levels):
+            k += 1
+        if k == 0:
+            i0, i1 = max(0, i0 - 1), min(self.n, i1 + 1)  # 两侧各多取一点, 边缘连线不断
+            idx = np.arange(i0, i1)
+            xs = self.start[:, None] + idx * st
+            ys = self.y[:, i0:i1].copy()
+            ys[idx[None, :] >= self.lengths[:, None]] = np.nan  # 补齐部分不画
+        else:
+            lo, hi = self.levels[k]
+            b0, b1 = max(0, (i0 >> k) - 1), min(lo.shape[1], ((i1 - 1) >> k) + 2)
+            centers = ((np.arange(b0, b1) << k) + ((1 << k) - 1) / 2.0) * st
+            xs = np.repeat(self.start[:, None] + centers, 2, axis=1)
+            ys = np.empty((len(lo), 2 * (b1 - b0)), dtype=np.float32)
+            ys[:, 0::2] = lo[:, b0:b1]
+            ys[:, 1::2] = hi[:, b0:b1]
+        if not self.multi:
+            return xs[0], ys[0]
+        # 多条曲线: 每条末尾接 NaN 断开, 拼成一条路径 (配合 connect='finite')
+        nan_col = np.full((len(xs), 1), np.nan)
+        return np.hstack([xs, nan_col]).ravel(), np.hstack([ys, nan_col]).ravel()
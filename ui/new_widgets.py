@@ -1,9 +1,161 @@
+import math
+from collections import OrderedDict
+import cv2
+import numpy as np
 import pyqtgraph as pg
-from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsRectItem
-from PyQt6.QtCore import Qt, pyqtSignal, QRectF, QTimer
+from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsRectItem
+from PyQt6.QtCore import Qt, pyqtSignal, QRectF, QLineF, QTimer
 from PyQt6.QtGui import QPixmap, QImage, QPainter, QColor, QPen
 
 
+# ==============================================================================
+# 🟢 瓦片金字塔图元: 固定大小瓦片 + 多级分辨率, 只为可见区域、当前细节层级生成瓦片 (LRU 缓存)
+#    第 k 级为原图 1/2^k 缩小 (INTER_AREA), 用到时才从上一级生成
+# ==============================================================================
+class TiledImageItem(QGraphicsItem):
+    def __init__(self, tile_size=512, max_tiles=384):
+        super().__init__()
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.levels = []
+        self.w = self.h = 0
+        self._tiles = OrderedDict()  # (level, tx, ty) -> QPixmap
+        # 需要 option.exposedRect 只重绘暴露区域
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+
+    def set_image(self, img_8u):
+        self.prepareGeometryChange()
+        self.h, self.w = img_8u.shape[:2]
+        self.levels = [np.ascontiguousarray(img_8u)]
+        self._tiles.clear()
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.w, self.h)
+
+    def _level(self, k):
+        while len(self.levels) <= k:
+            prev = self.levels[-1]
+            ph, pw = prev.shape[:2]
+            self.levels.append(cv2.resize(prev, ((pw + 1) // 2, (ph + 1) // 2), interpolation=cv2.INTER_AREA))
+        return self.levels[k]
+
+    def _max_level(self):
+        return max(0, int(math.ceil(math.log2(max(self.w, self.h, 1) / self.tile_size))))
+
+    def _tile_pixmap(self, k, tx, ty):
+        key = (k, tx, ty)
+        pix = self._tiles.get(key)
+        if pix is not None:
+            self._tiles.move_to_end(key)
+            return pix
+        ts = self.tile_size
+        tile = np.ascontiguousarray(self._level(k)[ty * ts:(ty + 1) * ts, tx * ts:(tx + 1) * ts])
+        th, tw = tile.shape[:2]
+        if tile.ndim == 2:
+            qimg = QImage(tile.data, tw, th, tw, QImage.Format.Format_Grayscale8)
+        else:
+            qimg = QImage(tile.data, tw, th, tw * 3, QImage.Format.Format_BGR888)
+        pix = QPixmap.fromImage(qimg)
+        self._tiles[key] = pix
+        if len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pix
+
+    def paint(self, painter, option, widget):
+        if not self.levels: return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        k = 0 if lod >= 1 else min(self._max_level(), int(math.floor(math.log2(1.0 / lod))))
+        lv = self._level(k)
+        lh, lw = lv.shape[:2]
+        fx, fy = self.w / lw, self.h / lh  # 该级像素 -> 场景坐标
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty(): return
+        ts = self.tile_size
+        tx0, tx1 = int(exposed.left() / fx) // ts, min((lw - 1) // ts, int(exposed.right() / fx) // ts)
+        ty0, ty1 = int(exposed.top() / fy) // ts, min((lh - 1) // ts, int(exposed.bottom() / fy) // ts)
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                pix = self._tile_pixmap(k, tx, ty)
+                target = QRectF(tx * ts * fx, ty * ts * fy, pix.width() * fx, pix.height() * fy)
+                painter.drawPixmap(target, pix, QRectF(pix.rect()))
+
+
+# ==============================================================================
+# 🟢 缺陷叠加层: 单个图元, 几何数据存数组 (每行一条带 [lo, hi)), 只画与暴露区域相交的部分
+#    缩小显示时, 间距不足 1 个屏幕像素的带合并为一条
+# ==============================================================================
+class DefectOverlayItem(QGraphicsItem):
+    def __init__(self):
+        super().__init__()
+        self.w = self.h = 0
+        self.bands = {}  # 'H' / 'V' -> (lo, hi) 按 lo 升序
+        self.pens = {'H': QPen(QColor("#ff1744"), 2), 'V': QPen(QColor("#2979ff"), 2)}
+        for pen in self.pens.values(): pen.setCosmetic(True)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.setZValue(1)
+
+    def set_bands(self, w, h, h_bands, v_bands):
+        """h_bands: 横向缺陷 (n, 2) 的 [y0, y1), v_bands: 纵向缺陷 (n, 2) 的 [x0, x1); 整体替换"""
+        self.prepareGeometryChange()
+        self.w, self.h = w, h
+        self.bands = {}
+        for key, b in (('H', h_bands), ('V', v_bands)):
+            b = np.asarray(b, dtype=np.float64).reshape(-1, 2)
+            order = np.argsort(b[:, 0], kind='stable')
+            self.bands[key] = (b[order, 0], b[order, 1])
+        self.update()
+
+    def clear(self):
+        self.set_bands(self.w, self.h, (), ())
+
+    def boundingRect(self):
+        m = 0.01 * max(self.w, self.h)  # 给外框线宽留余量 (cosmetic 笔宽随缩放变化)
+        return QRectF(-m, -m, self.w + 2 * m, self.h + 2 * m)
+
+    @staticmethod
+    def _visible(lo, hi, t0, t1, tol):
+        # lo 升序: 二分找到 lo < t1 的前缀, 再筛 hi > t0
+        n = np.searchsorted(lo, t1, side='left')
+        lo, hi = lo[:n], hi[:n]
+        keep = hi > t0
+        lo, hi = lo[keep], hi[keep]
+        if tol <= 0 or len(lo) < 2: return lo, hi
+        # 合并: 与前面所有带的最大下边界间距 <= tol 的归为一组
+        run_hi = np.maximum.accumulate(hi)
+        start = np.ones(len(lo), dtype=bool)
+        start[1:] = lo[1:] > run_hi[:-1] + tol
+        return lo[start], np.maximum.reduceat(hi, np.flatnonzero(start))
+
+    def paint(self, painter, option, widget):
+        if not self.bands: return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        tol = 1.0 / lod if lod < 1 else 0.0
+        exposed = option.exposedRect
+        x0, x1 = max(0.0, exposed.left()), min(float(self.w), exposed.right())
+        y0, y1 = max(0.0, exposed.top()), min(float(self.h), exposed.bottom())
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        for key, (lo, hi) in self.bands.items():
+            if len(lo) == 0: continue
+            # 带的长边只画暴露范围内的一段; 短边在图像边缘, 边缘可见时才画
+            if key == 'H':
+                lo, hi = self._visible(lo, hi, exposed.top(), exposed.bottom(), tol)
+                lines = [QLineF(x0, y, x1, y) for y in np.concatenate([lo, hi]).tolist()]
+                for x in (0.0, float(self.w)):
+                    if exposed.left() <= x <= exposed.right():
+                        lines += [QLineF(x, a, x, b) for a, b in zip(lo.tolist(), hi.tolist())]
+            else:
+                lo, hi = self._visible(lo, hi, exposed.left(), exposed.right(), tol)
+                lines = [QLineF(x, y0, x, y1) for x in np.concatenate([lo, hi]).tolist()]
+                for y in (0.0, float(self.h)):
+                    if exposed.top() <= y <= exposed.bottom():
+                        lines += [QLineF(a, y, b, y) for a, b in zip(lo.tolist(), hi.tolist())]
+            if lines:
+                painter.setPen(self.pens[key])
+                painter.drawLines(lines)
+
+
 class ZoomableGraphicsView(QGraphicsView):
     sig_mouse_moved = pyqtSignal(int, int)
     # 信号: 发送当前可视区域的矩形范围 (经过节流处理)
@@ -16,8 +168,11 @@ class ZoomableGraphicsView(QGraphicsView):
         self.scene_obj = QGraphicsScene(self)
         self.setScene(self.scene_obj)
 
-        self.pixmap_item = QGraphicsPixmapItem()
+        # 🟢 [修改] 瓦片金字塔替代整幅 QPixmap (超大画幅只上传可见瓦片)
+        self.pixmap_item = TiledImageItem()
         self.scene_obj.addItem(self.pixmap_item)
+        self.defect_overlay = DefectOverlayItem()
+        self.scene_obj.addItem(self.defect_overlay)
 
         # 🟢 渲染优化
         self.setRenderHint(QPainter.RenderHint.Antialiasing, False)
@@ -55,8 +210,7 @@ class ZoomableGraphicsView(QGraphicsView):
                 pass
             self.highlight_item = None
         h, w = numpy_img_8u.shape[:2]
-        qimg = QImage(numpy_img_8u.data, w, h, w, QImage.Format.Format_Grayscale8)
-        self.pixmap_item.setPixmap(QPixmap.fromImage(qimg))
+        self.pixmap_item.set_image(numpy_img_8u)
         self.scene_obj.setSceneRect(0, 0, w, h)
         self.fitInView(self.pixmap_item, Qt.AspectRatioMode.KeepAspectRatio)
         self._emit_viewport()
@@ -90,6 +244,15 @@ class ZoomableGraphicsView(QGraphicsView):
             self.sig_viewport_changed.emit(intersect)
             self._last_scene_rect = intersect
 
+    # 🟢 [新增] 强制发送当前可视区域 (即使与上次相同); immediate=False 时仍走节流
+    def force_emit_viewport(self, immediate=True):
+        self._last_scene_rect = QRectF()
+        if immediate:
+            self.throttle_timer.stop()
+            self._perform_emit_viewport()
+        else:
+            self._emit_viewport()
+
     def wheelEvent(self, event):
         factor = 1.1
         if event.angleDelta().y() < 0: factor = 1.0 / factor
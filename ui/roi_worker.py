@@ -0,0 +1,86 @@
+import threading
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.line_algorithm import LineDefectAlgorithm, IntegralProfileIndex, input_view
+
+
+# ==============================================================================
+# 🟢 ROI 实时重检: 常驻后台线程, 只保留最新一次请求 (拖动/平移过程中旧请求直接覆盖, 不排队)
+#    1) 积分索引查询 ROI 曲线 (O(h + w), 先刷新图表)  2) ROI 区域完整检测 (缺陷表 + 叠加线)
+#    每个请求带序号; 阶段之间检查序号, 过期即放弃, 结果到达 GUI 时再按序号丢弃过期的
+# ==============================================================================
+class RoiInspectWorker(QThread):
+    sig_stats = pyqtSignal(int, object)  # 请求序号, (ROI 曲线统计, x0, y0)
+    sig_result = pyqtSignal(int, object)  # 请求序号, inspect_roi() 的 (records, stats)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cond = threading.Condition()
+        self._pending = None  # (序号, img, (x, y, w, h), params), 新请求覆盖未开始的旧请求
+        self._gen = 0
+        self._stopping = False
+        self._index = None  # 积分投影索引 (按图像 + 位深 + 通道数复用, 在本线程中建立)
+        self._index_img = None
+        self._index_key = None
+
+    # --- GUI 线程调用 ---
+    def request(self, img, rect, params):
+        """提交新请求, 返回其序号"""
+        with self._cond:
+            self._gen += 1
+            self._pending = (self._gen, img, rect, params)
+            self._cond.notify()
+            return self._gen
+
+    def cancel(self):
+        """丢弃未开始的请求; 正在计算的请求在下一阶段放弃, 已发出的结果因序号过期被忽略"""
+        with self._cond:
+            self._gen += 1
+            self._pending = None
+
+    def is_current(self, gen):
+        return gen == self._gen
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._pending = None
+            self._cond.notify()
+        self.wait()
+
+    # --- 后台线程 ---
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping: return
+                gen, img, rect, params = self._pending
+                self._pending = None
+            try:
+                self._inspect(gen, img, rect, params)
+            except Exception as e:
+                print(f"ROI inspection failed: {e}")
+
+    def _get_index(self, img, params):
+        key = (params['effective_bits'], params['channel_count'])
+        if self._index is None or self._index_img is not img or self._index_key != key:
+            self._index = self._index_img = None  # 先释放旧索引 (约为原图 4 倍内存)
+            view, lut = input_view(img, params['effective_bits'])
+            self._index = IntegralProfileIndex(view, params['channel_count'], lut=lut)
+            self._index_img, self._index_key = img, key
+        return self._index
+
+    def _inspect(self, gen, img, rect, params):
+        roi = LineDefectAlgorithm.align_roi(*rect, *img.shape[:2], params['channel_count'])
+        if roi is None: return
+        x0, y0, w, h = roi
+
+        index = self._get_index(img, params)
+        if not self.is_current(gen): return
+        stats = index.roi_statistics(x0, y0, w, h, params)
+        if stats is not None: self.sig_stats.emit(gen, (stats, x0, y0))
+
+        if not self.is_current(gen): return
+        result = LineDefectAlgorithm.inspect_roi(img, x0, y0, w, h, params)
+        if result is not None and self.is_current(gen): self.sig_result.emit(gen, result)